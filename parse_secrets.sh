@@ -1,14 +1,21 @@
 #!/bin/bash
-# Wrapper script to parse secrets from stdin or file
+# Wrapper script to parse secrets from stdin or files
+# Usage: parse_secrets.sh [--stream | --workers N] [file | dir | glob ...]   (reads stdin when none is given)
+#        parse_secrets.sh --dry-run [file ...]   (prints what would be ingested, writes nothing)
+#        parse_secrets.sh --serve &   (keeps a warm parser that later calls hand their runs to)
+#        parse_secrets.sh --watch [dir]   (ingests files dropped into dir, default secrets/_inbox)
+#        parse_secrets.sh scan [dir | file ...]   (reports secrets left in a tree, exits 1 on findings;
+#                                                  as a pre-commit hook: exec parse_secrets.sh scan)
+#        parse_secrets.sh scan --history [repo ...]   (the same for every blob ever committed)
+#        parse_secrets.sh query [--service S] [--category C] [--host H] [--masked M] [--distinct COLUMN]
+#                                                  (looks up the records of all runs, masked)
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-PYTHON_SCRIPT="$SCRIPT_DIR/secrets_parser.py"
-
-if [ "$#" -eq 0 ]; then
-    # Read from stdin
-    python3 "$PYTHON_SCRIPT"
-else
-    # Read from file
-    python3 "$PYTHON_SCRIPT" "$1"
-fi
 
+# Import the parser rather than run it as a script: Python then reuses its
+# cached bytecode instead of compiling the whole file on every call.
+exec python3 -c 'import sys
+sys.path.insert(0, sys.argv.pop(1))
+sys.argv[0] = "parse_secrets.sh"
+from secrets_parser import main
+sys.exit(main())' "$SCRIPT_DIR" "$@"
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Benchmark secrets_parser.py on generated dumps.
+
+Generates deterministic synthetic dumps with a tunable mix of input types,
+parses each size in a fresh process and reports lines/sec, peak RSS and
+time per stage. Cold start, the wall time of a whole parse_secrets.sh call
+on a short snippet, is measured too. Results are compared with a stored
+baseline, and regressions are flagged with a non-zero exit status.
+
+Usage:
+    python scripts/bench_secrets_parser.py [--sizes 10k,1m,10m] [--mode text|file]
+                                           [--mix noise=40,jwt=2,...] [--repeat N] [--cold-runs N]
+                                           [--save-baseline]
+"""
+
+import argparse
+import json
+import random
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Relative weight of each input type in a generated dump
+DEFAULT_MIX = {
+    'role_table': 1,         # Role/Username/Password table
+    'email_table': 1,        # Email Address/.../Password table
+    'service_password': 3,   # SERVICE_PASSWORD_* lines
+    'pem': 1,                # PEM key blocks
+    'jwt': 2,
+    'sk_key': 2,             # sk- API keys
+    'ghp_key': 2,            # GitHub tokens
+    'aiza_key': 2,           # Google API keys
+    'traefik': 1,            # traefik basicauth users
+    'db_uri': 2,
+    'env': 4,                # NAME=value assignments
+    'url': 3,
+    'noise': 60,             # Prose, comments and blank lines
+}
+
+# Stages timed in each mode: label -> parser method
+STAGES = {
+    'text': {'tag_lines': 'engine.tag_lines', 'tables': '_scan_tables', 'main': '_scan_lines',
+             'classify': 'classify_unknown'},
+    'file': {'tables': '_stream_tables', 'main': '_stream_lines', 'classify': 'classify_unknown'},
+}
+WRITE_STAGES = ['_write_parsed_json', '_write_report', '_write_global_env', '_write_csvs',
+                '_write_service_envs', '_write_registry', '_update_readme']
+
+# Stdin of the cold start runs: what a pre-commit hook or editor save hands over
+SNIPPET = ("OPENAI_API_KEY=sk-" + "a1B2c3D4e5" * 4 + "\n"
+           "deploy notes for the staging cluster\n"
+           "github dashboard https://github.com/confersolutions\n")
+# Cold start runs: label -> parse_secrets.sh arguments ({output} is a fresh workspace)
+COLD_STARTS = {
+    'dry_run': ['--no-daemon', '--dry-run', '--output', '{output}'],
+    'run': ['--no-daemon', '--output', '{output}'],
+}
+
+SERVICES = ['openai', 'groq', 'github', 'qdrant', 'n8n', 'flowise', 'coolify', 'postgres', 'redis', 'minio']
+WORDS = ['the', 'server', 'deploy', 'notes', 'backup', 'staging', 'prod', 'rotate', 'ticket', 'login',
+         'cluster', 'region', 'client', 'invoice', 'meeting', 'config', 'migrate', 'cache', 'domain', 'vpn']
+
+
+def parse_size(text: str) -> int:
+    """'10k' -> 10000, '1m' -> 1000000."""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, int]:
+    """DEFAULT_MIX overridden by 'type=weight,...'."""
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (text or '').split(',')):
+        name, _, weight = part.partition('=')
+        if name not in mix:
+            raise ValueError(f"unknown input type {name!r}; choose from {', '.join(mix)}")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("the mix has no input type with a positive weight")
+    return mix
+
+
+def generate(lines: int, seed: int = 0, mix: Optional[Dict[str, int]] = None) -> Iterator[str]:
+    """Yield exactly `lines` lines of a synthetic dump; the same arguments give the same dump."""
+    r = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = [kind for kind, weight in mix.items() if weight > 0]
+    weights = [mix[kind] for kind in kinds]
+    alnum = string.ascii_letters + string.digits
+
+    def token(n: int, chars: str = alnum) -> str:
+        return ''.join(r.choices(chars, k=n))
+
+    emitted = 0
+    while emitted < lines:
+        kind = r.choices(kinds, weights)[0]
+        if kind == 'role_table':
+            block = ["Role\tUsername\tPassword"]
+            block += [f"{r.choice(['admin', 'dev', 'ops', 'viewer'])}\tuser{token(4)}\t{token(14)}"
+                      for _ in range(r.randint(1, 6))]
+            block.append("")
+        elif kind == 'email_table':
+            block = ["Email Address\tCoolify\tn8n\tPassword"]
+            block += [f"{r.choice(['dev01', 'employee', 'admin', 'ops'])}{token(3, string.ascii_lowercase)}"
+                      f"@confersolutions.ai\t✅\t☐\t{token(14)}" for _ in range(r.randint(1, 6))]
+            block.append("")
+        elif kind == 'service_password':
+            block = [f"SERVICE_PASSWORD_{r.choice(['POSTGRES', 'REDIS', 'MINIO', 'QDRANTAPIKEY', 'N8N'])}"
+                     f"={token(20)}"]
+        elif kind == 'pem':
+            key_type = r.choice(['OPENSSH', 'RSA', 'EC'])
+            block = [f"-----BEGIN {key_type} PRIVATE KEY-----"]
+            block += [token(64, alnum + '+/') for _ in range(r.randint(4, 25))]
+            block.append(f"-----END {key_type} PRIVATE KEY-----")
+        elif kind == 'jwt':
+            block = [f"token: eyJ{token(20)}.eyJ{token(40)}.{token(43)}"]
+        elif kind == 'sk_key':
+            block = [f"{r.choice(SERVICES[:2])} key sk-{token(48)}"]
+        elif kind == 'ghp_key':
+            block = [f"github ghp_{token(36)}"]
+        elif kind == 'aiza_key':
+            block = [f"google AIza{token(35)}"]
+        elif kind == 'traefik':
+            block = [f"traefik.http.middlewares.auth.basicauth.users=admin:$$2y$$05${token(53)},"
+                     f"ops:$$apr1${token(8)}${token(22)}"]
+        elif kind == 'db_uri':
+            block = [f"{r.choice(['postgres', 'mysql', 'redis', 'mongodb'])}://u{token(4)}:{token(16)}"
+                     f"@db-{token(5, string.ascii_lowercase)}.internal:5432/app{token(3)}"]
+        elif kind == 'env':
+            block = [f"{r.choice(SERVICES).upper()}_{token(6, string.ascii_uppercase)}={token(24)}"]
+        elif kind == 'url':
+            block = [f"{r.choice(SERVICES)} dashboard https://{token(6, string.ascii_lowercase)}."
+                     f"{r.choice(['openai.com', 'groq.com', 'github.com', 'example.org'])}/v1/{token(5)}"]
+        else:
+            roll = r.random()
+            if roll < 0.1:
+                block = [""]
+            elif roll < 0.2:
+                block = ["# " + ' '.join(r.choices(WORDS, k=r.randint(2, 6)))]
+            else:
+                block = [' '.join(r.choices(WORDS, k=r.randint(3, 12)))]
+        for line in block[:lines - emitted]:
+            yield line
+        emitted += min(len(block), lines - emitted)
+
+
+def dump_file(work: Path, lines: int, seed: int, mix: Dict[str, int]) -> Path:
+    """Path of the generated dump for these arguments, generated on first use."""
+    mix_key = '_'.join(f"{kind}{weight}" for kind, weight in mix.items() if weight != DEFAULT_MIX[kind])
+    path = work / f"dump_{lines}_{seed}{'_' + mix_key if mix_key else ''}.txt"
+    if not path.exists():
+        work.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix('.tmp')
+        with open(temp, 'w') as f:
+            f.writelines(line + '\n' for line in generate(lines, seed, mix))
+        temp.replace(path)
+    return path
+
+
+def _timed(times: Dict[str, float], label: str, method):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            times[label] = times.get(label, 0.0) + time.perf_counter() - start
+    return timed
+
+
+def run_one(dump: Path, mode: str) -> Dict[str, object]:
+    """Parse dump and write the outputs into a temporary workspace; runs in the child process."""
+    sys.path.insert(0, str(REPO_ROOT))
+    import secrets_parser
+
+    times: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as output:
+        parser = secrets_parser.SecretsParser(output)
+        for label, name in STAGES[mode].items():
+            owner = parser.engine if name.startswith('engine.') else parser
+            attr = name.rpartition('.')[2]
+            setattr(owner, attr, _timed(times, label, getattr(owner, attr)))
+        for name in WRITE_STAGES:
+            setattr(parser, name, _timed(times, name, getattr(parser, name)))
+
+        start = time.perf_counter()
+        if mode == 'file':
+            parser.parse_file(str(dump))
+            raw_text = None
+        else:
+            raw_text = dump.read_text()
+            parser.parse_raw_text(raw_text)
+        parse_seconds = time.perf_counter() - start
+        records = sum(len(items) for items in parser.parsed_data.values())
+
+        start = time.perf_counter()
+        parser.write_outputs(raw_text)
+        write_seconds = time.perf_counter() - start
+        parser.fingerprints.close()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'parse_seconds': parse_seconds,
+        'write_seconds': write_seconds,
+        'records': records,
+        'peak_rss_mb': peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10),
+        'stages': times,
+    }
+
+
+def bench(dump: Path, lines: int, mode: str, repeat: int = 1) -> Dict[str, object]:
+    """Run run_one in fresh interpreters, so peak RSS covers this size alone; keeps the fastest of `repeat` runs."""
+    runs = []
+    for _ in range(repeat):
+        child = subprocess.run([sys.executable, __file__, '--child', str(dump), '--mode', mode],
+                               capture_output=True, text=True, check=True)
+        runs.append(json.loads(child.stdout.splitlines()[-1]))
+    result = min(runs, key=lambda run: run['parse_seconds'] + run['write_seconds'])
+    result['lines'] = lines
+    result['lines_per_sec'] = lines / result['parse_seconds'] if result['parse_seconds'] else 0.0
+    return result
+
+
+def cold_start(runs: int) -> Dict[str, float]:
+    """Fastest wall time of each COLD_STARTS call over `runs` fresh processes, after one untimed run."""
+    result = {}
+    for label, arguments in COLD_STARTS.items():
+        times = []
+        for i in range(runs + 1):
+            with tempfile.TemporaryDirectory() as output:
+                command = [str(REPO_ROOT / 'parse_secrets.sh')] + [arg.format(output=output) for arg in arguments]
+                start = time.perf_counter()
+                subprocess.run(command, input=SNIPPET, capture_output=True, text=True, check=True)
+                if i:  # The first run may compile and cache bytecode
+                    times.append(time.perf_counter() - start)
+        result[label] = min(times)
+    return result
+
+
+def compare_cold_start(result: Dict[str, float], base: Dict[str, float], threshold: float,
+                       min_seconds: float) -> List[str]:
+    """Cold start regressions of result against base, as in compare."""
+    return [f"cold start {label} {base[label] * 1000:.0f}ms -> {seconds * 1000:.0f}ms"
+            for label, seconds in result.items()
+            if label in base and seconds > base[label] * (1 + threshold) and seconds - base[label] > min_seconds]
+
+
+def compare(result: Dict[str, object], base: Dict[str, object], threshold: float,
+            min_seconds: float) -> List[str]:
+    """Regressions of result against base: slower by more than threshold, or using more memory."""
+    regressions = []
+    if (result['lines_per_sec'] < base['lines_per_sec'] * (1 - threshold)
+            and result['parse_seconds'] - base['parse_seconds'] > min_seconds):
+        regressions.append(f"lines/sec {base['lines_per_sec']:,.0f} -> {result['lines_per_sec']:,.0f}")
+    if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+        regressions.append(f"peak RSS {base['peak_rss_mb']:.0f} MB -> {result['peak_rss_mb']:.0f} MB")
+    timings = dict(result['stages'], write_outputs=result['write_seconds'])
+    base_timings = dict(base['stages'], write_outputs=base['write_seconds'])
+    for stage, seconds in timings.items():
+        before = base_timings.get(stage)
+        if before is not None and seconds > before * (1 + threshold) and seconds - before > min_seconds:
+            regressions.append(f"{stage} {before:.2f}s -> {seconds:.2f}s")
+    return regressions
+
+
+def print_result(key: str, result: Dict[str, object]):
+    print(f"{key}: {result['lines']:,} lines, {result['records']:,} records")
+    print(f"  parse {result['parse_seconds']:.2f}s ({result['lines_per_sec']:,.0f} lines/sec), "
+          f"write_outputs {result['write_seconds']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB")
+    for stage, seconds in result['stages'].items():
+        print(f"  {stage:<22} {seconds:8.3f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    cli = argparse.ArgumentParser(description="Benchmark secrets_parser.py on generated dumps.")
+    cli.add_argument('--sizes', default='10k,1m,10m', help="dump sizes in lines (default: 10k,1m,10m)")
+    cli.add_argument('--mode', choices=sorted(STAGES), default='text',
+                     help="text: parse_raw_text; file: parse_file (mmap)")
+    cli.add_argument('--mix', help="input type weights, e.g. noise=80,pem=0 (see DEFAULT_MIX)")
+    cli.add_argument('--seed', type=int, default=0)
+    cli.add_argument('--repeat', type=int, default=1, metavar='N', help="keep the fastest of N runs per size")
+    cli.add_argument('--cold-runs', type=int, default=10, metavar='N',
+                     help="time cold starts over N runs each, 0 to skip (default: 10)")
+    cli.add_argument('--cold-min-seconds', type=float, default=0.02,
+                     help="ignore cold start slowdowns smaller than this (default: 0.02)")
+    cli.add_argument('--work', type=Path, default=Path(tempfile.gettempdir()) / 'secrets-parser-bench',
+                     help="where generated dumps are kept between runs")
+    cli.add_argument('--baseline', type=Path, default=REPO_ROOT / 'output' / 'bench' / 'baseline.json',
+                     help="baseline results to compare with")
+    cli.add_argument('--save-baseline', action='store_true', help="store this run's results as the baseline")
+    cli.add_argument('--threshold', type=float, default=0.10,
+                     help="relative slowdown or memory growth flagged as a regression (default: 0.10)")
+    cli.add_argument('--min-seconds', type=float, default=0.05,
+                     help="ignore stage slowdowns smaller than this (default: 0.05)")
+    cli.add_argument('--generate', type=Path, metavar='FILE', help="only write a dump of the first size to FILE")
+    cli.add_argument('--child', type=Path, help=argparse.SUPPRESS)
+    args = cli.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_one(args.child, args.mode)))
+        return 0
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(',')]
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        cli.error(str(e))
+    if args.generate:
+        with open(args.generate, 'w') as f:
+            f.writelines(line + '\n' for line in generate(sizes[0], args.seed, mix))
+        return 0
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    mix_key = ','.join(f"{kind}={weight}" for kind, weight in mix.items() if weight != DEFAULT_MIX[kind])
+    results = {}
+    flagged = 0
+    for lines in sizes:
+        key = f"{args.mode}/{lines}/seed={args.seed}" + (f"/{mix_key}" if mix_key else '')
+        result = results[key] = bench(dump_file(args.work, lines, args.seed, mix), lines, args.mode,
+                                     max(1, args.repeat))
+        print_result(key, result)
+        if key in baseline and not args.save_baseline:
+            regressions = compare(result, baseline[key], args.threshold, args.min_seconds)
+            for regression in regressions:
+                print(f"  REGRESSION {regression}")
+            flagged += bool(regressions)
+
+    if args.cold_runs > 0:
+        key = 'cold_start'
+        result = results[key] = cold_start(args.cold_runs)
+        print(f"{key}: " + ', '.join(f"{label} {seconds * 1000:.0f}ms" for label, seconds in result.items()))
+        if key in baseline and not args.save_baseline:
+            regressions = compare_cold_start(result, baseline[key], args.threshold, args.cold_min_seconds)
+            for regression in regressions:
+                print(f"  REGRESSION {regression}")
+            flagged += bool(regressions)
+
+    if args.save_baseline:
+        baseline.update(results)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f"\nBaseline saved: {args.baseline}")
+    elif flagged:
+        print(f"\n{flagged} of {len(results)} benchmarks regressed against {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,14 +5,39 @@ Classifies, normalizes, and organizes raw secrets/notes dump.
 """
 
 import re
+import sys
 import json
-import csv
+import gc
 import hashlib
+import heapq
+import io
 import os
-from datetime import datetime
+import argparse
+import codecs
+import locale
+import mmap
+import operator
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, compress, islice, repeat
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from types import MappingProxyType
+from typing import (TYPE_CHECKING, Dict, List, Any, Optional, Tuple, Iterable, Iterator, TextIO, BinaryIO, Container,
+                    Mapping)
 from collections import defaultdict
+from contextlib import contextmanager
+from functools import cached_property, lru_cache, partial
+
+# Modules only some stages need (yaml, csv, sqlite3, concurrent.futures, the
+# daemon's asyncio...) are imported where used, which keeps startup short for
+# the many short CLI runs of hooks and editors.
+if TYPE_CHECKING:
+    import asyncio
+    import socket
+    import subprocess
+    from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 # Mask function: show first 4 and last 2 chars
 def mask_secret(value: str, min_length: int = 6) -> str:
@@ -23,35 +48,1871 @@ def mask_secret(value: str, min_length: int = 6) -> str:
         return value[:2] + "****"
     return value[:4] + "…" * max(1, (len(value) - 6) // 4) + value[-2:]
 
+_yaml_module: Any = False  # Not looked up yet
+
+def yaml_module() -> Any:
+    """Return PyYAML, imported on first use, or None if it is not installed."""
+    global _yaml_module
+    if _yaml_module is False:
+        try:
+            import yaml
+        except ImportError:
+            yaml = None
+        _yaml_module = yaml
+    return _yaml_module
+
+_numpy_module: Any = False  # Not looked up yet
+
+def numpy_module() -> Any:
+    """Return NumPy, imported on first use, or None if it is not installed."""
+    global _numpy_module
+    if _numpy_module is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy_module = numpy
+    return _numpy_module
+
 def hash_value(value: str) -> str:
     """Generate SHA256 hash for deduplication."""
     return hashlib.sha256(value.encode()).hexdigest()[:16]
 
+FINGERPRINT_KEY_FILE = ".fingerprint.key"  # Under the output base, see SecretsParser.use_keyed_fingerprints
+
+def load_fingerprint_key(output_base: Path) -> Optional[bytes]:
+    """The output base's fingerprint key, or None if it fingerprints values with plain SHA-256."""
+    try:
+        return bytes.fromhex((Path(output_base) / FINGERPRINT_KEY_FILE).read_text().strip())
+    except FileNotFoundError:
+        return None
+
+class ValueInterner:
+    """Fingerprints and masks of secret values, each computed once per distinct value.
+
+    The same value recurs across a dump and across categories, and is
+    masked again by the env var check against API keys; both results are
+    cached per value, least recently used first out beyond `maxsize`
+    values. Records thus share one mask string per value, and value_hashes
+    the value strings the cache holds. With a key, fingerprints are keyed
+    BLAKE2b, as long as the SHA-256 ones, so stored hashes cannot be matched
+    against hashes precomputed from candidate secrets without the key.
+    """
+
+    def __init__(self, key: Optional[bytes] = None, maxsize: int = 1 << 16):
+        self.key = key
+        if key is None:
+            self.fingerprint = lru_cache(maxsize)(hash_value)
+        else:
+            keyed = hashlib.blake2b(digest_size=8, key=key)
+
+            def fingerprint(value: str) -> str:
+                digest = keyed.copy()
+                digest.update(value.encode())
+                return digest.hexdigest()
+            self.fingerprint = lru_cache(maxsize)(fingerprint)
+        self.mask = lru_cache(maxsize)(mask_secret)
+
+def file_signature(path: Path) -> Optional[str]:
+    """Size and modification time of a file, which change whenever it is written; None if missing."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+@contextmanager
+def atomic_write(path: Path, newline: Optional[str] = None, mode: Optional[int] = None) -> Iterator[TextIO]:
+    """Open a temporary file beside `path` that replaces it once written without error.
+
+    Readers see either the old file or the whole new one. The file gets
+    permission bits `mode` if given, else an existing file's carry over and
+    a new file is private to its owner.
+    """
+    import tempfile
+    fd, temp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', newline=newline) as f:
+            yield f
+        try:
+            os.chmod(temp, os.stat(path).st_mode & 0o7777 if mode is None else mode)
+        except FileNotFoundError:
+            pass
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.unlink(temp)
+        except FileNotFoundError:
+            pass
+        raise
+
+class ScanEngine:
+    """Compiled rule set shared by every parse.
+
+    All rules are compiled once. Lines are tagged with the literal triggers
+    they contain, a block at a time or one line through the combined gate
+    matcher, and a rule is only evaluated when one of its triggers fired, so
+    noise lines never reach the rule regexes.
+    """
+
+    # (name, literal) - a rule can only match a line containing one of its
+    # triggers. Literals are matched against the lower-cased line.
+    TRIGGERS = [
+        ('openai', 'openai'),
+        ('sk', 'sk-'),
+        ('ghp', 'ghp_'),
+        ('aiza', 'aiza'),
+        ('xox', 'xox'),
+        ('bearer', 'bearer'),
+        ('eyj', 'eyj'),
+        ('user', 'user'),
+        ('login', 'login'),
+        ('account', 'account'),
+        ('pass', 'pass'),
+        ('role', 'role'),
+        ('email', 'email'),
+        ('at', '@'),
+        ('pem', '-----begin'),
+        ('traefik', 'traefik'),
+        ('scheme', '://'),
+    ]
+    # Non-ASCII characters re.IGNORECASE treats as equal to an ASCII letter
+    CASE_FOLD = {0x130: 'i', 0x131: 'i', 0x17f: 's', 0x212a: 'k'}
+
+    def __init__(self):
+        names = [name for name, _ in self.TRIGGERS] + ['sep', 'dot']
+        self.bits = {name: 1 << i for i, name in enumerate(names)}
+        # A gate match consumes its text, hiding any trigger that starts inside
+        # it; a literal whose tail overlaps another trigger's head implies it.
+        literal_bits = {literal: self.bits[name] for name, literal in self.TRIGGERS}
+        changed = True
+        while changed:
+            changed = False
+            for head in literal_bits:
+                for tail in literal_bits:
+                    if head != tail and any(head.endswith(tail[:k]) for k in range(1, len(tail))):
+                        if literal_bits[tail] & ~literal_bits[head]:
+                            literal_bits[head] |= literal_bits[tail]
+                            changed = True
+        self._literal_bits = literal_bits
+        self.gate = re.compile('|'.join(re.escape(literal) for _, literal in self.TRIGGERS))
+        self._gate_findall = self.gate.findall
+        # Block tagging finds each literal separately, so no match hides another
+        self._block_literals = list(self._literal_bits.items()) + [
+            (':', self.bits['sep']), ('=', self.bits['sep']), ('.', self.bits['dot'])]
+        self._byte_block_literals = [(literal.encode(), bits) for literal, bits in self._block_literals]
+
+        # API keys / tokens: first matching rule wins, in this order
+        self.api_key_rules = [
+            (self._compile(r'OPENAI[_-]?KEY[:=]\s*([^\s]+)'), self._triggers('openai'), 'openai', 'OPENAI_API_KEY'),
+            (self._compile(r'sk-[A-Za-z0-9]{20,}'), self._triggers('sk'), 'openai', 'OPENAI_API_KEY'),
+            (self._compile(r'ghp_[A-Za-z0-9]{36,}'), self._triggers('ghp'), 'github', 'GITHUB_TOKEN'),
+            (self._compile(r'AIza[0-9A-Za-z_-]{35,}'), self._triggers('aiza'), 'google', 'GOOGLE_API_KEY'),
+            (self._compile(r'xox[baprs]-[A-Za-z0-9-]+'), self._triggers('xox'), 'slack', 'SLACK_TOKEN'),
+            (self._compile(r'Bearer\s+([\w\.-]+)'), self._triggers('bearer'), None, None),  # Generic bearer
+            (self._compile(r'eyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+'), self._triggers('eyj'), None, 'JWT_TOKEN'),  # JWT
+        ]
+        self.api_key_bits = 0
+        for _, bits, _, _ in self.api_key_rules:
+            self.api_key_bits |= bits
+
+        self.username = self._compile(r'(?:user(?:name)?|login|account)[:=]\s*([^\s]+)')
+        self.username_bits = self._triggers('user', 'login', 'account')
+        self.password = self._compile(r'pass(?:word|wd)?[:=]\s*([^\s]+)')
+        self.password_bits = self._triggers('pass')
+        self.db_uri = self._compile(r'(postgres|mysql|mongodb|redis|amqp|neo4j|qdrant)(\+s)?://([^\s]+)')
+        self.db_uri_bits = self._triggers('scheme')
+        # PEM blocks of any label: keys, certificates, PGP armor (see SecretsParser._pem_block)
+        self.ssh_header = self._compile(r'-----BEGIN\s+([A-Z0-9]+(?:\s[A-Z0-9]+)*)-----')
+        self.pem_end = self._compile(r'-----END\s+[A-Z0-9]+(?:\s[A-Z0-9]+)*-----')
+        self.pem_body = re.compile(r'[A-Za-z0-9+/=]*|[A-Za-z-]+: .*')  # Base64, or a Proc-Type/Comment header
+        self.ssh_block = re.compile(r'-----BEGIN.*?KEY-----\s*(.*?)\s*-----END.*?KEY-----', re.DOTALL)  # Legacy
+        self.ssh_bits = self._triggers('pem')
+        self.env_var = re.compile(r'([A-Z][A-Z0-9_]+)[:=]\s*([^\s]+)')  # Case-sensitive
+        self.env_var_bits = self._triggers('sep')
+        self.traefik = self._compile(r'traefik[^=]*basicauth[^=]*=(.+)')
+        self.traefik_users = re.compile(r',(?=\w+:)')
+        self.traefik_bits = self._triggers('traefik')
+        self.endpoint = self._compile(r'(https?://[^\s]+|[a-z0-9.-]+\.(com|net|org|io|dev|app|cloud)[^\s]*)')
+        self.endpoint_bits = self._triggers('scheme', 'dot')
+        self.db_uri_parts = re.compile(r'(?:^|://)([^:/@]+):([^@]+)@([^/]+)/(.+)')  # The rule's match has no scheme
+
+        # Credential tables and service-specific password lines
+        self.table_header = self._compile(r'(Role|Username|Password|Email\s+Address)')
+        self.table_header_bits = self._triggers('role', 'user', 'pass', 'email')
+        self.table_split = re.compile(r'\t+|\s{2,}')
+        self.table_checkbox = re.compile(r'^[☐✅]')
+        self.email = re.compile(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+        self.email_pass = re.compile(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\s+.*?([A-Za-z0-9@#$%^&*!]{8,})')
+        self.email_bits = self._triggers('at')
+        self.prev_user = self._compile(r'(?:Account|Username|User)[:=]\s*([^\s]+)')
+        # (regex, service, username, generic) - generic rules are SERVICE_PASSWORD_<NAME>
+        self.service_pass_rules = [
+            (self._compile(r'SSH\s*Password[:=]\s*([^\s]+)'), 'ssh', '', False),
+            (self._compile(r'Coolify\s+Password[:=]\s*([^\s]+)'), 'coolify', '', False),
+            (self._compile(r'Coolify\s+Account[:=]\s*([^\s]+)'), 'coolify', '', False),
+            (self._compile(r'Contabo\s+Account\s+Password[:=]\s*([^\s]+)'), 'contabo', '', False),
+            (self._compile(r'Contabo\s+Account[:=]\s*([^\s]+)'), 'contabo', '', False),
+            (self._compile(r'n8n.*Password[:=]\s*([^\s]+)'), 'n8n', '', False),
+            (self._compile(r'CLOUDFLARE\s+password[:=]\s*([^\s]+)'), 'cloudflare', '', False),
+            (self._compile(r'Snap\s+Shooter\s+Password[:=]\s*([^\s]+)'), 'snapshot', '', False),
+            (self._compile(r'SERVICE_PASSWORD_(\w+)[:=]\s*([^\s]+)'), None, None, True),  # Generic service password env vars
+        ]
+        self.service_pass_bits = self._triggers('pass', 'account')
+
+    @staticmethod
+    def _compile(pattern: str) -> 're.Pattern':
+        return re.compile(pattern, re.IGNORECASE)
+
+    def _triggers(self, *names: str) -> int:
+        bits = 0
+        for name in names:
+            bits |= self.bits[name]
+        return bits
+
+    def tag(self, line: str) -> int:
+        """Return the bitmask of triggers present in a line."""
+        if line.isascii():
+            lower = line.lower()
+        else:
+            lower = line.translate(self.CASE_FOLD).lower()
+        tags = 0
+        literal_bits = self._literal_bits
+        for literal in self._gate_findall(lower):
+            tags |= literal_bits[literal]
+        if ':' in lower or '=' in lower:
+            tags |= self.bits['sep']
+        if '.' in lower:
+            tags |= self.bits['dot']
+        return tags
+
+    def tag_lines(self, lines: List[str]) -> List[int]:
+        """tag() for a block of lines, scanning the joined block once per trigger literal."""
+        joined = '\n'.join(lines)
+        if joined.isascii():
+            joined = joined.lower()
+        else:
+            joined = joined.translate(self.CASE_FOLD).lower()  # Keeps every character's position
+        return self._tag_joined(joined, lines, self._block_literals)
+
+    def tag_byte_lines(self, lines: List[bytes], encoding: str) -> List[int]:
+        """tag_lines() for raw lines of an ASCII-compatible encoding."""
+        joined = b'\n'.join(lines).lower()
+        tags = self._tag_joined(joined, lines, self._byte_block_literals)
+        if not joined.isascii():
+            # re.IGNORECASE folds some non-ASCII letters: tag those lines as text
+            for i in compress(range(len(lines)), map(operator.not_, map(bytes.isascii, lines))):
+                tags[i] = self.tag(lines[i].decode(encoding, 'replace'))
+        return tags
+
+    @staticmethod
+    def _tag_joined(joined, lines, literals) -> List[int]:
+        # C-level find() skips ahead to each occurrence; once a line has a
+        # literal's bit the search resumes at the next line.
+        starts = list(accumulate(map((1).__add__, map(len, lines)), initial=0))
+        tags = [0] * len(lines)
+        find = joined.find
+        for literal, bits in literals:
+            pos = find(literal)
+            while pos != -1:
+                i = bisect_right(starts, pos) - 1
+                tags[i] |= bits
+                pos = find(literal, starts[i + 1])
+        return tags
+
+
+_default_engine: Optional[ScanEngine] = None
+
+def default_engine() -> ScanEngine:
+    """Return the process-wide engine, compiling the rules on first use."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = ScanEngine()
+    return _default_engine
+
+class ProfiledPattern:
+    """A rule regex whose search() calls are counted and timed by a RuleProfiler."""
+
+    def __init__(self, regex: 're.Pattern', stats: List[Any], profiler: 'RuleProfiler'):
+        self.regex = regex
+        self._stats = stats  # [name, pattern, evaluations, hits, seconds]
+        self._observe = profiler.observe
+
+    def search(self, string: str, *args) -> Optional['re.Match']:
+        start = time.perf_counter()
+        match = self.regex.search(string, *args)
+        seconds = time.perf_counter() - start
+        stats = self._stats
+        stats[2] += 1
+        stats[4] += seconds
+        if match is not None:
+            stats[3] += 1
+        self._observe(seconds, stats[0], string)
+        return match
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.regex, name)
+
+class RuleProfiler:
+    """Evaluations, hits and cumulative time of each rule, and the slowest evaluations."""
+
+    SLOWEST = 20
+
+    def __init__(self):
+        self.rules: List[List[Any]] = []
+        self._slowest: List[Tuple[float, int, str, str]] = []  # Min-heap of (seconds, seq, rule, line)
+        self._seq = 0
+
+    def wrap(self, name: str, regex: 're.Pattern') -> ProfiledPattern:
+        stats = [name, regex.pattern, 0, 0, 0.0]
+        self.rules.append(stats)
+        return ProfiledPattern(regex, stats, self)
+
+    def observe(self, seconds: float, rule: str, line: str):
+        slowest = self._slowest
+        if len(slowest) < self.SLOWEST:
+            self._seq += 1
+            heapq.heappush(slowest, (seconds, self._seq, rule, line))
+        elif seconds > slowest[0][0]:
+            self._seq += 1
+            heapq.heapreplace(slowest, (seconds, self._seq, rule, line))
+
+    @staticmethod
+    def preview(line: str, width: int = 100) -> str:
+        """The line with long tokens masked, as secrets may be among them."""
+        return re.sub(r'[\w+/$-]{12,}', lambda m: mask_secret(m.group()), line.strip())[:width]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rules by cumulative time, slowest evaluations first; lines are masked."""
+        return {
+            'rules': [{'rule': name, 'pattern': pattern, 'evaluations': evaluations, 'hits': hits,
+                       'seconds': seconds}
+                      for name, pattern, evaluations, hits, seconds in
+                      sorted(self.rules, key=lambda stats: -stats[4])],
+            'slowest': [{'rule': rule, 'seconds': seconds, 'length': len(line), 'line': self.preview(line)}
+                        for seconds, _, rule, line in sorted(self._slowest, reverse=True)],
+        }
+
+class ProfilingEngine(ScanEngine):
+    """ScanEngine whose rules record their evaluations, hits and time in self.profiler (--profile)."""
+
+    PROFILED = ['username', 'password', 'db_uri', 'ssh_header', 'env_var', 'traefik', 'endpoint',
+                'table_header', 'email', 'email_pass', 'prev_user']
+
+    def __init__(self):
+        super().__init__()
+        self.profiler = RuleProfiler()
+        wrap = self.profiler.wrap
+        self.api_key_rules = [(wrap(f"api_key_rules[{i}] {key_name or 'bearer'}", regex), bits, service, key_name)
+                              for i, (regex, bits, service, key_name) in enumerate(self.api_key_rules)]
+        self.service_pass_rules = [(wrap(f"service_pass_rules[{i}] {service or 'SERVICE_PASSWORD_*'}", regex),
+                                    service, username, generic)
+                                   for i, (regex, service, username, generic) in enumerate(self.service_pass_rules)]
+        for name in self.PROFILED:
+            setattr(self, name, wrap(name, getattr(self, name)))
+
+class ServiceCatalog:
+    """Services attributed to credentials, env var keys, URLs and emails by keyword.
+
+    One catalog backs every lookup: each kind takes the first service of its
+    priority list whose keyword occurs in the lower-cased text, and URL hosts
+    are first looked up by domain suffix. Entries of a services.yaml file
+    (see load) come after the built-in ones.
+    """
+
+    # (keyword, service) in priority order, for context lines and env var keys
+    KEYWORDS = [
+        ('openai', 'openai'),
+        ('groq', 'groq'),
+        ('qdrant', 'qdrant'),
+        ('neo4j', 'neo4j'),
+        ('vercel', 'vercel'),
+        ('coolify', 'coolify'),
+        ('github', 'github'),
+        ('replit', 'replit'),
+        ('clerk', 'clerk'),
+        ('n8n', 'n8n'),
+        ('flowise', 'flowise'),
+        ('postgres', 'postgres'),
+        ('mysql', 'mysql'),
+        ('redis', 'redis'),
+    ]
+    # Domain -> service; a URL host takes its longest listed suffix, else the
+    # first domain found anywhere in the URL
+    DOMAINS = {
+        'openai.com': 'openai',
+        'groq.com': 'groq',
+        'qdrant.io': 'qdrant',
+        'neo4j.com': 'neo4j',
+        'vercel.com': 'vercel',
+        'coolify.io': 'coolify',
+        'github.com': 'github',
+        'replit.com': 'replit',
+        'clerk.com': 'clerk',
+        'api.openai.com': 'openai',
+        'api.groq.com': 'groq',
+    }
+    # (keyword, service) in priority order, for email addresses
+    EMAIL_KEYWORDS = [
+        ('dev', 'development'),
+        ('employee', 'internal'),
+        ('admin', 'admin'),
+        ('confersolutions', 'confer'),
+        ('confer', 'confer'),
+    ]
+    # Host of an http(s) URL or a bare domain: after any scheme and user info, before port or path
+    HOST = re.compile(r'(?:[a-z][a-z0-9+.-]*://)?(?:[^/?#@]*@)?([^/?#:]*)')
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]] = (), domains: Iterable[Tuple[str, str]] = (),
+                 email_keywords: Iterable[Tuple[str, str]] = ()):
+        self.keywords = self.KEYWORDS + [(keyword.lower(), service) for keyword, service in keywords]
+        self.domains = dict(self.DOMAINS)
+        for domain, service in domains:
+            self.domains.setdefault(domain.lower(), service)
+        self.domain_order = list(self.domains.items())
+        self.email_keywords = self.EMAIL_KEYWORDS + [(keyword.lower(), service) for keyword, service in email_keywords]
+
+    @classmethod
+    def load(cls, path: Path) -> 'ServiceCatalog':
+        """The built-in catalog, extended by `path` when it exists.
+
+        The file maps keywords, domains and emails (email keywords) to service names:
+            keywords: {supabase: supabase}
+            domains: {supabase.co: supabase}
+        """
+        if not path.exists():
+            return default_catalog()
+        yaml = yaml_module()
+        with open(path, 'r') as f:
+            if yaml is not None:
+                data = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+            else:
+                data = json.load(f) or {}
+        return cls((data.get('keywords') or {}).items(), (data.get('domains') or {}).items(),
+                   (data.get('emails') or {}).items())
+
+    @staticmethod
+    def _first(text: str, order: List[Tuple[str, str]]) -> Optional[str]:
+        for keyword, service in order:
+            if keyword in text:
+                return service
+        return None
+
+    def context_service(self, context: List[str]) -> str:
+        """Service named anywhere in a window of lines."""
+        text = context[0] if len(context) == 1 else ' '.join(context)
+        return self._first(text.lower(), self.keywords) or 'unknown'
+
+    def key_service(self, key: str) -> Optional[str]:
+        return self._first(key.lower(), self.keywords)
+
+    def url_service(self, url: str) -> str:
+        url_lower = url.lower()
+        host = self.HOST.match(url_lower).group(1)
+        while host:
+            service = self.domains.get(host)
+            if service is not None:
+                return service
+            host = host.partition('.')[2]  # Next suffix
+        return self._first(url_lower, self.domain_order) or 'unknown'
+
+    def email_service(self, email: str) -> str:
+        return self._first(email.lower(), self.email_keywords) or 'unknown'
+
+_default_catalog: Optional[ServiceCatalog] = None
+
+def default_catalog() -> ServiceCatalog:
+    """Return the process-wide built-in catalog, compiling it on first use."""
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = ServiceCatalog()
+    return _default_catalog
+
+def iter_lines(source: Iterable[str], tee: Optional[TextIO] = None) -> Iterator[str]:
+    """Yield the lines of a text stream exactly as raw_text.split('\\n') would.
+
+    Every line read is also copied to `tee` when given.
+    """
+    ended = True  # An empty stream still splits into ['']
+    for line in source:
+        if tee is not None:
+            tee.write(line)
+        ended = line.endswith('\n')
+        yield line[:-1] if ended else line
+    if ended:
+        yield ''
+
+class LineBuffer:
+    """Sliding window over a line iterator; lines are tagged as they are read."""
+
+    plain = None  # Text lines need no special handling for untagged lines
+
+    def __init__(self, lines: Iterator[str], engine: ScanEngine):
+        self._lines = lines
+        self._engine = engine
+        self.lines: List[str] = []
+        self.tags: List[int] = []
+        self.base = 0  # Line index of self.lines[0]
+        self.eof = False
+
+    def fill(self, count: int) -> bool:
+        """Read until the window holds `count` lines; return True once the input is exhausted."""
+        need = count - len(self.lines)
+        if need > 0 and not self.eof:
+            new = list(islice(self._lines, need))
+            if len(new) < need:
+                self.eof = True
+            self.lines.extend(new)
+            self.tags.extend(self._engine.tag_lines(new))
+        return self.eof
+
+    def release(self, index: int):
+        """Drop the lines before absolute line index `index`."""
+        drop = index - self.base
+        if drop > 0:
+            del self.lines[:drop]
+            del self.tags[:drop]
+            self.base += drop
+
+class MappedFile:
+    """Read-only memory map of a dump file, scanned as bytes.
+
+    Only ASCII-compatible encodings and files with one line-ending style are
+    mapped; parse_file falls back to text mode for anything else.
+    """
+
+    ENCODINGS = ('utf-8', 'ascii', 'latin-1', 'iso8859-1', 'cp1252')
+    BLOCK_BYTES = 1 << 20
+    # What str.strip() removes from an ASCII line
+    STRIP = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+    MIXED_NEWLINES = re.compile(rb'\r(?!\n)|(?<!\r)\n')
+
+    def __init__(self, path: Path, encoding: str):
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.encoding = encoding
+        # Text mode reads \r\n and lone \r as \n: split CRLF files on b'\r\n'
+        # and leave mixed line endings to the text path (newline is None).
+        if self.buf.find(b'\r') == -1:
+            self.newline = b'\n'
+        elif self.MIXED_NEWLINES.search(self.buf) is None:
+            self.newline = b'\r\n'
+        else:
+            self.newline = None
+
+    def decode(self, start: int, end: int) -> str:
+        return self.buf[start:end].decode(self.encoding, 'replace')
+
+    def blocks(self) -> Iterator[Tuple[int, List[bytes]]]:
+        """Yield (offset, lines) for consecutive runs of whole lines, as text.split('\\n') would."""
+        buf = self.buf
+        newline = self.newline
+        size = len(buf)
+        pos = 0
+        while True:
+            cut = buf.find(newline, min(pos + self.BLOCK_BYTES, size))
+            if cut == -1:
+                yield pos, buf[pos:size].split(newline)
+                return
+            yield pos, buf[pos:cut].split(newline)
+            pos = cut + len(newline)
+
+class TextSource:
+    """Input text held in memory, as a source for SourceRef."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def decode(self, start: int, end: int) -> str:
+        return self.text[start:end]
+
+class SourceRef:
+    """Stripped source line held as offsets into a MappedFile or TextSource; read only when needed."""
+
+    __slots__ = ('source', 'start', 'end', 'limit')
+
+    def __init__(self, source, start: int, end: int, limit: Optional[int] = None):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.limit = limit
+
+    def text(self) -> str:
+        text = self.source.decode(self.start, self.end).strip()
+        return text if self.limit is None else text[:self.limit]
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def __getitem__(self, key):
+        # Truncating slices like source_line[:100] stay lazy
+        if key.__class__ is slice and key.start is None and key.step is None:
+            stop = key.stop
+            if stop is not None and stop >= self.end - self.start:
+                return self  # Never shorter than the raw length: nothing to cut
+            if stop is not None and stop >= 0:
+                limit = self.limit
+                return SourceRef(self.source, self.start, self.end, stop if limit is None or stop < limit else limit)
+        return self.text()[key]
+
+    def __eq__(self, other) -> bool:
+        return self.text() == str(other)
+
+    def __hash__(self) -> int:
+        return hash(self.text())
+
+class TextLines:
+    """Line offsets of a text split on newlines, to reference lines by number."""
+
+    def __init__(self, text: str, lines: List[str], offset: int = 0):
+        self.source = TextSource(text)
+        self.starts = array('q', accumulate(map((1).__add__, map(len, lines)), initial=0))
+        self.offset = offset  # Line number of the text's first line minus one
+
+    def ref(self, line_num: int, limit: Optional[int] = None) -> SourceRef:
+        """The stripped line `line_num` (1-based), truncated to `limit`."""
+        i = line_num - self.offset
+        return SourceRef(self.source, self.starts[i - 1], self.starts[i] - 1, limit)
+
+class RecordEncoder(json.JSONEncoder):
+    """JSON encoder that resolves SourceRef values to text."""
+
+    _encode_str = staticmethod(json.encoder.encode_basestring_ascii)
+
+    def default(self, o):
+        if isinstance(o, SourceRef):
+            return o.text()
+        return super().default(o)
+
+    def encode_record(self, record: Dict[str, Any], indent: str) -> str:
+        """json.dumps(record, indent=2, cls=RecordEncoder), its lines after the first prefixed by `indent`.
+
+        Records of string, int and None fields, i.e. all parsed_data records,
+        are formatted directly with the C string encoder; json.dumps only
+        indents through its pure-Python encoder.
+        """
+        if not record:
+            return '{}'
+        encode_str = self._encode_str
+        fields = []
+        for key, value in record.items():
+            cls = value.__class__
+            if cls is str:
+                value = encode_str(value)
+            elif cls is SourceRef:
+                value = encode_str(value.text())
+            elif cls is int:
+                value = int.__repr__(value)
+            elif value is None:
+                value = 'null'
+            else:
+                return json.dumps(record, indent=2, cls=RecordEncoder).replace('\n', '\n' + indent)
+            if key.__class__ is not str:
+                return json.dumps(record, indent=2, cls=RecordEncoder).replace('\n', '\n' + indent)
+            fields.append(f'{encode_str(key)}: {value}')
+        inner = '\n' + indent + '  '
+        return '{' + inner + (',' + inner).join(fields) + '\n' + indent + '}'
+
+class MappedLineBuffer:
+    """LineBuffer over a MappedFile: lines stay bytes and are decoded on access.
+
+    It also serves as the parser's line locator (see TextLines) while its
+    window is scanned.
+    """
+
+    def __init__(self, mapped: MappedFile, engine: ScanEngine, tag_cache: Optional[array] = None):
+        self.mapped = mapped
+        self._blocks = mapped.blocks()
+        self._engine = engine
+        # Tags of every line read so far, shared between passes over the same map
+        self._tag_cache = array('I') if tag_cache is None else tag_cache
+        self.lines = MappedLines(mapped)
+        self.tags: List[int] = []
+        self.base = 0
+        self.eof = False
+
+    def fill(self, count: int) -> bool:
+        """Read whole blocks until the window holds `count` lines; return True once the input is exhausted."""
+        step = len(self.mapped.newline)
+        while len(self.tags) < count and not self.eof:
+            block = next(self._blocks, None)
+            if block is None:
+                self.eof = True
+                break
+            offset, raw = block
+            self.lines.raw.extend(raw)
+            self.lines.starts.extend(accumulate(map(step.__add__, map(len, raw[:-1])), initial=offset))
+            start = self.base + len(self.tags)
+            cached = self._tag_cache[start:start + len(raw)]
+            if len(cached) == len(raw):
+                self.tags.extend(cached)
+            else:
+                tags = self._engine.tag_byte_lines(raw, self.mapped.encoding)
+                self.tags.extend(tags)
+                self._tag_cache.extend(tags)
+        return self.eof
+
+    def release(self, index: int):
+        """Drop the lines before absolute line index `index`."""
+        drop = index - self.base
+        if drop > 0:
+            del self.lines.raw[:drop]
+            del self.lines.starts[:drop]
+            del self.tags[:drop]
+            self.base += drop
+
+    def ref(self, line_num: int, limit: Optional[int] = None) -> SourceRef:
+        """The stripped line `line_num` (1-based, inside the window), truncated to `limit`."""
+        i = line_num - 1 - self.base
+        start = self.lines.starts[i]
+        return SourceRef(self.mapped, start, start + len(self.lines.raw[i]), limit)
+
+    def plain(self, start: int, stop: int) -> Tuple[int, List[Tuple[int, SourceRef]]]:
+        """Classify the run of untagged lines from `start` without decoding them.
+
+        Returns the index ending the run (the next tagged line or `stop`) and
+        (index, source) for each line in it that is not blank or a comment.
+        """
+        tags = self.tags
+        raw = self.lines.raw
+        starts = self.lines.starts
+        mapped = self.mapped
+        strip = MappedFile.STRIP
+        found = []
+        i = start
+        while i < stop and not tags[i]:
+            line = raw[i]
+            if line.isascii():
+                head = line.lstrip(strip)[:1]
+                if head and head != b'#':
+                    found.append((i, SourceRef(mapped, starts[i], starts[i] + len(line))))
+            else:
+                text = line.decode(mapped.encoding, 'replace').strip()
+                if text and text[0] != '#':
+                    found.append((i, SourceRef(mapped, starts[i], starts[i] + len(line))))
+            i += 1
+        return i, found
+
+class MappedLines:
+    """Sequence of the raw lines in a MappedLineBuffer, decoding each line on access."""
+
+    def __init__(self, mapped: MappedFile):
+        self.mapped = mapped
+        self.raw: List[bytes] = []
+        self.starts: List[int] = []  # Offset of each line in the map
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __getitem__(self, i):
+        encoding = self.mapped.encoding
+        if isinstance(i, slice):
+            return [line.decode(encoding, 'replace') for line in self.raw[i]]
+        return self.raw[i].decode(encoding, 'replace')
+
+# Fields of each parsed_data category, in record order, with their column type
+RECORD_COLUMNS = {
+    "api_keys": [("service", "intern"), ("key_name", "intern"), ("value_masked", "str"), ("value_hash", "str"),
+                 ("source_line", 100), ("line_num", "int"), ("notes", "intern")],
+    "credentials": [("service", "intern"), ("username", "str"), ("password_masked", "str"), ("url", "intern"),
+                    ("source_line", 100), ("line_num", "int"), ("notes", "intern")],
+    "tokens": [("service", "intern"), ("token_type", "intern"), ("value_masked", "str"), ("value_hash", "str"),
+               ("username", "str"), ("expires_at", "intern"), ("source_line", 100), ("line_num", "int"),
+               ("notes", "intern")],
+    "db_uris": [("service", "intern"), ("uri_masked", "str"), ("uri_hash", "str"), ("username", "str"),
+                ("host", "str"), ("dbname", "str"), ("source_line", 100), ("line_num", "int"), ("notes", "intern")],
+    "ssh": [("type", "intern"), ("label", "intern"), ("path_written", "intern"), ("comment", "intern"),
+            ("source_line", 100), ("line_num", "int")],
+    "env_vars": [("service", "intern"), ("name", "intern"), ("value_masked", "str"), ("value_hash", "str"),
+                 ("scope", "intern"), ("source_line", 100), ("line_num", "int"), ("notes", "intern")],
+    "endpoints": [("service", "intern"), ("url", "str"), ("source_line", 100), ("line_num", "int"),
+                  ("notes", "intern")],
+    "unknown": [("raw_line", 200), ("line_num", "int"), ("guess", "intern")],
+}
+
+# Secondary indexes per parsed_data category: index name -> record field
+RECORD_INDEXES = {
+    "api_keys": {"masked": "value_masked", "hash": "value_hash", "service": "service", "key": "key_name"},
+    "credentials": {"masked": "password_masked", "service": "service"},
+    "tokens": {"masked": "value_masked", "hash": "value_hash", "service": "service"},
+    "db_uris": {"masked": "uri_masked", "hash": "uri_hash", "service": "service"},
+    "ssh": {},
+    "env_vars": {"masked": "value_masked", "hash": "value_hash", "service": "service", "key": "name"},
+    "endpoints": {"service": "service"},
+    "unknown": {},
+}
+
+class RecordIndex:
+    """Secondary indexes over the records of one parsed_data category.
+
+    Each index maps a field value to the positions of the records holding
+    it, with values in first-seen order, so membership tests and per-value
+    counts never scan the records.
+    """
+
+    def _init_indexes(self, fields: Optional[Dict[str, str]]):
+        self.fields = fields or {}
+        self.indexes: Dict[str, Dict[Any, List[int]]] = {name: {} for name in self.fields}
+
+    def _index(self, position: int, record: Dict[str, Any]):
+        for name, field in self.fields.items():
+            self.indexes[name].setdefault(record.get(field), []).append(position)
+
+    def has(self, index: str, value: Any) -> bool:
+        """Whether any record has `value` in the field behind `index`."""
+        return value in self.indexes[index]
+
+    def lookup(self, index: str, value: Any) -> List[int]:
+        """Positions of the records with `value` in the field behind `index`."""
+        return self.indexes[index].get(value, [])
+
+    def distinct(self, index: str) -> Iterable[Any]:
+        """Values of the field behind `index`, in first-seen order."""
+        return self.indexes[index].keys()
+
+class RecordList(RecordIndex):
+    """Indexed list of record dicts, for small in-memory parses where RecordStore columns cost more than they save."""
+
+    def __init__(self, fields: Optional[Dict[str, str]] = None):
+        self._init_indexes(fields)
+        self.records: List[Dict[str, Any]] = []
+
+    def append(self, record: Dict[str, Any]):
+        if self.fields:
+            self._index(len(self.records), record)
+        self.records.append(record)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.records)
+
+    def select(self, *names: str) -> Iterator[tuple]:
+        """The fields `names` of each record as a tuple, in order."""
+        return (tuple(record[name] for name in names) for record in self.records)
+
+    def update(self, name: str, values: Dict[int, Any]):
+        """Set field `name`, which must not be indexed, of the records at the given positions."""
+        for i, value in values.items():
+            self.records[i][name] = value
+
+class Column:
+    """One field of a RecordStore: a list of values."""
+
+    def __init__(self):
+        self.values = []
+        self.put = self.values.append
+
+    def get(self, i: int) -> Any:
+        return self.values[i]
+
+class InternColumn(Column):
+    """Column of low-cardinality strings (services, key names, ...), deduplicated so repeats share one object."""
+
+    def __init__(self):
+        super().__init__()
+        append = self.values.append
+        shared = {}.setdefault
+        self.put = lambda value: append(shared(value, value))
+
+class IntColumn(Column):
+    """Column of non-negative integers in a flat array."""
+
+    def __init__(self):
+        self.values = array('Q')
+        self.put = self.values.append
+
+class SourceColumn:
+    """Column of source lines truncated to `limit`.
+
+    SourceRefs with that limit are kept as (source, start, end) in flat
+    arrays and read back when the record is; other values are kept as is.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.sources = [None]  # Index 0: value kept as is in `inline`
+        self._source_ids: Dict[int, int] = {}
+        self.ids = array('H')
+        self.starts = array('Q')
+        self.ends = array('Q')
+        self.inline: Dict[int, Any] = {}
+
+    def put(self, value: Any):
+        if type(value) is SourceRef and value.source is self.sources[-1] and value.limit == self.limit:
+            # Same source as the previous line: the common case
+            self.ids.append(len(self.sources) - 1)
+            self.starts.append(value.start)
+            self.ends.append(value.end)
+            return
+        source_id = 0
+        if type(value) is SourceRef and value.limit == self.limit:
+            source_id = self._source_ids.get(id(value.source))
+            if source_id is None and len(self.sources) <= 0xffff:
+                source_id = self._source_ids[id(value.source)] = len(self.sources)
+                self.sources.append(value.source)
+        if source_id:
+            self.starts.append(value.start)
+            self.ends.append(value.end)
+        else:
+            self.inline[len(self.ids)] = value
+            self.starts.append(0)
+            self.ends.append(0)
+        self.ids.append(source_id)
+
+    def get(self, i: int) -> Any:
+        source_id = self.ids[i]
+        if not source_id:
+            value = self.inline[i]
+            return value.text() if type(value) is SourceRef else value
+        return SourceRef(self.sources[source_id], self.starts[i], self.ends[i], self.limit).text()
+
+    def texts(self) -> Iterator[Any]:
+        """Every value as get returns it, in order."""
+        sources = self.sources
+        limit = self.limit
+        for i, (source_id, start, end) in enumerate(zip(self.ids, self.starts, self.ends)):
+            if source_id:
+                yield sources[source_id].decode(start, end).strip()[:limit]
+            else:
+                value = self.inline[i]
+                yield value.text() if type(value) is SourceRef else value
+
+class RecordStore(RecordIndex):
+    """Columnar, indexed store of the records of one parsed_data category.
+
+    Records are appended as dicts shaped as in RECORD_COLUMNS and kept one
+    column per field: line numbers in an array, repeated strings interned and
+    source lines as offsets into the input. Reading returns the same dicts,
+    with source lines resolved to text.
+    """
+
+    def __init__(self, columns: List[Tuple[str, Any]], fields: Optional[Dict[str, str]] = None,
+                 records: Iterable[Dict[str, Any]] = ()):
+        self._init_indexes(fields)
+        self.names = [name for name, _ in columns]
+        self.columns = [self._column(kind) for _, kind in columns]
+        self._puts = [column.put for column in self.columns]
+        self._odd: Dict[int, Dict[str, Any]] = {}  # Records of another shape, kept whole
+        self._slots = list(zip(self._puts, self.names))
+        self._shape = set(self.names)
+        self._ints = [name for name, column in zip(self.names, self.columns) if type(column) is IntColumn]
+        self._count = 0
+        self.extend(records)
+
+    @staticmethod
+    def _column(kind):
+        if kind == 'int':
+            return IntColumn()
+        if kind == 'intern':
+            return InternColumn()
+        if kind == 'str':
+            return Column()
+        return SourceColumn(kind)
+
+    def append(self, record: Dict[str, Any]):
+        position = self._count
+        if self.fields:
+            self._index(position, record)
+        fits = record.keys() == self._shape
+        if fits:
+            for name in self._ints:
+                value = record[name]
+                if type(value) is not int or value < 0:
+                    fits = False
+        if fits:
+            for put, name in self._slots:
+                put(record[name])
+        else:
+            self._odd[position] = record
+            for put, column in zip(self._puts, self.columns):
+                put(0 if type(column) is IntColumn else None)
+        self._count += 1
+
+    def extend(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.append(record)
+
+    def select(self, *names: str) -> Iterator[tuple]:
+        """The fields `names` of each record as a tuple, in order, read without building the records."""
+        columns = [self.columns[self.names.index(name)] for name in names]
+        rows = zip(*[column.texts() if type(column) is SourceColumn else iter(column.values) for column in columns])
+        if not self._odd:
+            return rows
+        odd = self._odd
+        return (tuple(odd[i].get(name) for name in names) if i in odd else row for i, row in enumerate(rows))
+
+    def update(self, name: str, values: Dict[int, Any]):
+        """Set field `name`, which must not be indexed nor a source line, of the records at the given positions."""
+        column = self.columns[self.names.index(name)]
+        for i, value in values.items():
+            odd = self._odd.get(i)
+            if odd is not None:
+                odd[name] = value
+            else:
+                column.values[i] = value
+
+    def _record(self, i: int) -> Dict[str, Any]:
+        odd = self._odd.get(i)
+        if odd is not None:
+            return odd
+        return dict(zip(self.names, [column.get(i) for column in self.columns]))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._record(j) for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('record index out of range')
+        return self._record(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return map(self._record, range(self._count))
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"RecordStore({list(self)!r})"
+
+class RecordSpool(RecordIndex):
+    """Append-only list of records backed by a JSON-lines temp file.
+
+    The first `head_size` records stay in memory for the parse report;
+    iterating streams the rest back from disk. Indexes stay in memory.
+    """
+
+    _encoder = RecordEncoder()
+
+    def __init__(self, directory: Path, fields: Optional[Dict[str, str]] = None, head_size: int = 20):
+        self.directory = directory
+        self.head_size = head_size
+        self.head: List[Dict[str, Any]] = []
+        self._count = 0
+        self._file = None
+        self._init_indexes(fields)
+
+    def append(self, record: Dict[str, Any]):
+        self._index(self._count, record)
+        if self._count < self.head_size:
+            self.head.append(record)
+        else:
+            if self._file is None:
+                import tempfile
+                self._file = tempfile.NamedTemporaryFile('w+', dir=self.directory, prefix='.spool_', suffix='.jsonl')
+            self._file.write(self._encoder.encode(record) + '\n')
+        self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        yield from self.head
+        if self._file is not None:
+            self._file.flush()
+            with open(self._file.name, 'r') as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def select(self, *names: str) -> Iterator[tuple]:
+        """The fields `names` of each record as a tuple, in order."""
+        return (tuple(record[name] for name in names) for record in self)
+
+    def update(self, name: str, values: Dict[int, Any]):
+        """Set field `name`, which must not be indexed, of the records at the given positions.
+
+        Spooled records are rewritten to a new temp file in one pass.
+        """
+        for i, value in values.items():
+            if i < len(self.head):
+                self.head[i][name] = value
+        if self._file is None or max(values, default=-1) < len(self.head):
+            return
+        import tempfile
+        self._file.flush()
+        updated = tempfile.NamedTemporaryFile('w+', dir=self.directory, prefix='.spool_', suffix='.jsonl')
+        with open(self._file.name, 'r') as f:
+            for i, line in enumerate(f, len(self.head)):
+                if i in values:
+                    record = json.loads(line)
+                    record[name] = values[i]
+                    line = self._encoder.encode(record) + '\n'
+                updated.write(line)
+        self._file.close()
+        self._file = updated
+
+    def close(self):
+        """Delete the backing temp file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class FingerprintIndex:
+    """Persistent record of the inputs, values and .env.global keys of earlier runs.
+
+    A SQLite database under the output base: value hashes let a run skip
+    known secrets before building records, and the keys written to
+    .env.global spare re-reading that file while it is unchanged since.
+    Input digests let a run skip a dump parsed before, and their resume
+    checkpoints let it parse only what was appended to one. Digests of the
+    generated service files spare rewriting those a run leaves unchanged.
+    """
+
+    def __init__(self, path: Path, readonly: bool = False):
+        import sqlite3
+        self.path = path
+        self._prefetched: set = set()  # Hashes looked up by prefetch, and those of them recorded
+        self._known: set = set()
+        if readonly:
+            # For lookups only (--dry-run): no schema updates, and a missing database is an error
+            self.db = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+            return
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS fingerprints (hash TEXT PRIMARY KEY, first_run TEXT) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS env_keys (name TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, signature TEXT) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS inputs (digest TEXT PRIMARY KEY, size INTEGER, path TEXT, run TEXT,
+                                               resume_offset INTEGER, resume_line INTEGER,
+                                               resume_before INTEGER, resume_scan INTEGER);
+            CREATE INDEX IF NOT EXISTS inputs_path ON inputs (path);
+            CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, digest TEXT, signature TEXT) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS runs (run TEXT PRIMARY KEY, raw_digest TEXT) WITHOUT ROWID;
+        """)
+
+    def __contains__(self, value_hash: str) -> bool:
+        if value_hash in self._prefetched:
+            return value_hash in self._known
+        return self.db.execute("SELECT 1 FROM fingerprints WHERE hash = ?", (value_hash,)).fetchone() is not None
+
+    def prefetch(self, value_hashes: Iterable[str]):
+        """Look many hashes up in a few queries, so that `in` answers them from memory."""
+        todo = list(set(value_hashes) - self._prefetched)
+        for start in range(0, len(todo), 500):
+            chunk = todo[start:start + 500]
+            self._known.update(row[0] for row in self.db.execute(
+                f"SELECT hash FROM fingerprints WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+        self._prefetched.update(todo)
+
+    def add(self, value_hashes: Iterable[str], run: str):
+        """Record the value hashes of a finished run."""
+        value_hashes = list(value_hashes)
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?, ?)",
+                                ((value_hash, run) for value_hash in value_hashes))
+        self._known.update(value_hashes)
+
+    def tracks(self, env_file: Path) -> bool:
+        """Whether env_keys matches env_file, i.e. the file is unchanged since add_env_keys."""
+        row = self.db.execute("SELECT signature FROM files WHERE path = ?", (str(env_file),)).fetchone()
+        return row is not None and row[0] == file_signature(env_file)
+
+    def has_env_key(self, name: str) -> bool:
+        return self.db.execute("SELECT 1 FROM env_keys WHERE name = ?", (name,)).fetchone() is not None
+
+    def reset_env_keys(self, names: Iterable[str]):
+        """Replace the known keys with those read from .env.global."""
+        with self.db:
+            self.db.execute("DELETE FROM env_keys")
+            self.db.executemany("INSERT OR IGNORE INTO env_keys VALUES (?)", ((name,) for name in names))
+
+    def add_env_keys(self, names: Iterable[str], env_file: Path):
+        """Record keys appended to env_file, and the file's state after the write."""
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO env_keys VALUES (?)", ((name,) for name in names))
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (str(env_file), file_signature(env_file)))
+
+    def find_input(self, digest: str) -> Optional[str]:
+        """The run that ingested an input with this digest, if any."""
+        row = self.db.execute("SELECT run FROM inputs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def last_input(self, path: str) -> Optional[Tuple[int, str, Optional[Tuple[int, int, int, bool]]]]:
+        """(size, digest, checkpoint) of the last ingested version of the file at path."""
+        row = self.db.execute("SELECT size, digest, resume_offset, resume_line, resume_before, resume_scan"
+                              " FROM inputs WHERE path = ? ORDER BY rowid DESC LIMIT 1", (path,)).fetchone()
+        if row is None:
+            return None
+        size, digest, offset, line, before, scan = row
+        return size, digest, None if offset is None else (offset, line, before, bool(scan))
+
+    def has_inputs(self) -> bool:
+        return self.db.execute("SELECT 1 FROM inputs LIMIT 1").fetchone() is not None
+
+    def has_fingerprints(self) -> bool:
+        return self.db.execute("SELECT 1 FROM fingerprints LIMIT 1").fetchone() is not None
+
+    def add_input(self, digest: str, size: int, path: Optional[str], run: str, raw_digest: str,
+                  checkpoint: Optional[Tuple[int, int, int, bool]] = None):
+        """Record an ingested input and where parsing may resume once data is appended to it.
+
+        raw_digest is the digest of the run's raw intake file, recorded with
+        the run's first input. An input of a run recorded with another raw
+        digest raises ValueError: the run id was reused for other content.
+        """
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO runs VALUES (?, ?)", (run, raw_digest))
+            self.db.execute("UPDATE runs SET raw_digest = ? WHERE run = ? AND raw_digest IS NULL", (raw_digest, run))
+            recorded = self.db.execute("SELECT raw_digest FROM runs WHERE run = ?", (run,)).fetchone()[0]
+            if recorded != raw_digest:
+                raise ValueError(f"run {run} already recorded inputs of another raw intake file")
+            self.db.execute("DELETE FROM inputs WHERE digest = ?", (digest,))
+            self.db.execute("INSERT INTO inputs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (digest, size, path, run, *(checkpoint or (None,) * 4)))
+
+    def unchanged(self, path: Path, digest: str) -> bool:
+        """Whether path holds content with this digest, written by add_outputs and untouched since."""
+        row = self.db.execute("SELECT digest, signature FROM outputs WHERE path = ?", (str(path),)).fetchone()
+        return row is not None and row[0] == digest and row[1] == file_signature(path)
+
+    def add_outputs(self, outputs: Iterable[Tuple[Path, str]]):
+        """Record the digests of files just written, and their state after the write."""
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)",
+                                ((str(path), digest, file_signature(path)) for path, digest in outputs))
+
+    def has_runs(self) -> bool:
+        return self.db.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is not None
+
+    def add_runs(self, runs: Iterable[str]) -> int:
+        """Record runs by run id; returns the number of runs recorded so far."""
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO runs (run) VALUES (?)", ((run,) for run in runs))
+        return self.db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+class Inventory:
+    """Every record of every run, masked, in one indexed SQLite store (inventory.db under the output base).
+
+    Fed by write_outputs, and queried by the `query` command. Values are
+    held as masks and fingerprints only, and unknown lines are left out.
+    The CSVs under global/ are generated from this store's views.
+    """
+
+    # Inventory column -> record field per category (see RECORD_COLUMNS); host is derived
+    FIELDS = {
+        "api_keys": {"name": "key_name", "masked": "value_masked", "fingerprint": "value_hash"},
+        "credentials": {"username": "username", "masked": "password_masked", "url": "url"},
+        "tokens": {"kind": "token_type", "masked": "value_masked", "fingerprint": "value_hash",
+                   "username": "username", "expires_at": "expires_at"},
+        "db_uris": {"name": "dbname", "masked": "uri_masked", "fingerprint": "uri_hash", "username": "username"},
+        "ssh": {"kind": "type", "name": "path_written"},
+        "env_vars": {"name": "name", "kind": "scope", "masked": "value_masked", "fingerprint": "value_hash"},
+        "endpoints": {"url": "url"},
+    }
+    COLUMNS = ['run', 'category', 'service', 'name', 'kind', 'username', 'masked', 'fingerprint', 'host', 'url',
+               'expires_at', 'notes', 'line_num']
+    # CSV under global/ -> (view, header)
+    CSV_VIEWS = {
+        "credentials.csv": ("credentials_csv", ['service', 'username', 'password_masked', 'url', 'notes']),
+        "tokens.csv": ("tokens_csv", ['service', 'token_type', 'value_masked', 'expires_at', 'notes']),
+        "endpoints.csv": ("endpoints_csv", ['service', 'url', 'region', 'notes']),
+    }
+
+    def __init__(self, path: Path, readonly: bool = False):
+        import sqlite3
+        if readonly:
+            self.db = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+            return
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, run TEXT, category TEXT, service TEXT,
+                                                name TEXT, kind TEXT, username TEXT, masked TEXT, fingerprint TEXT,
+                                                host TEXT, url TEXT, expires_at TEXT, notes TEXT, line_num INTEGER);
+            CREATE INDEX IF NOT EXISTS records_service ON records (service, category);
+            CREATE INDEX IF NOT EXISTS records_category ON records (category);
+            CREATE INDEX IF NOT EXISTS records_fingerprint ON records (fingerprint);
+            CREATE INDEX IF NOT EXISTS records_host ON records (host);
+            CREATE INDEX IF NOT EXISTS records_masked ON records (masked);
+            CREATE TABLE IF NOT EXISTS runs (run TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE VIEW IF NOT EXISTS credentials_csv AS
+                SELECT service, username, masked AS password_masked, url, notes
+                FROM records WHERE category = 'credentials' ORDER BY id;
+            CREATE VIEW IF NOT EXISTS tokens_csv AS
+                SELECT service, kind AS token_type, masked AS value_masked, expires_at, notes
+                FROM records WHERE category = 'tokens' ORDER BY id;
+            CREATE VIEW IF NOT EXISTS endpoints_csv AS
+                SELECT service, url, '' AS region, notes
+                FROM records WHERE category = 'endpoints' ORDER BY id;
+        """)
+
+    @classmethod
+    def open(cls, output_base: Path) -> 'Inventory':
+        """The inventory of output_base, created from the _intake/*_parsed.json snapshots if there is none yet.
+
+        CSVs the snapshots do not account for (edited by hand, or from runs
+        whose snapshots were removed) are kept aside as <name>.pre-inventory
+        and regenerated from the store.
+        """
+        path = output_base / "inventory.db"
+        if path.exists():
+            return cls(path)
+        output_base.mkdir(parents=True, exist_ok=True)
+        inventory = cls(path)
+        snapshots = sorted((output_base / "_intake").glob("*_parsed.json"))
+        for snapshot in snapshots:
+            with open(snapshot) as f:
+                inventory.add_run(snapshot.name[:-len("_parsed.json")], json.load(f))
+        for name in cls.CSV_VIEWS:
+            csv_file = output_base / "global" / name
+            content = inventory.csv(name)
+            if csv_file.exists() and csv_file.read_bytes().decode() != content:
+                csv_file.rename(csv_file.with_name(name + '.pre-inventory'))
+                print(f"Kept {csv_file} as {name}.pre-inventory: it holds rows the parse snapshots do not",
+                      file=sys.stderr)
+                if content is not None:
+                    with atomic_write(csv_file) as f:
+                        f.write(content)
+        return inventory
+
+    @staticmethod
+    def _host(url: Optional[str]) -> Optional[str]:
+        if not url:
+            return None
+        from urllib.parse import urlsplit
+        try:
+            return urlsplit(url if '//' in url else '//' + url).hostname
+        except ValueError:
+            return None
+
+    def _rows(self, run: str, parsed_data: Mapping[str, Iterable[Dict[str, Any]]]) -> Iterator[Tuple[Any, ...]]:
+        for category, fields in self.FIELDS.items():
+            for record in parsed_data.get(category, ()):
+                row = {column: record.get(field) for column, field in fields.items()}
+                row['host'] = self._host(record.get('host') or row.get('url'))
+                yield (run, category, record.get('service'), row.get('name'), row.get('kind'), row.get('username'),
+                       row.get('masked'), row.get('fingerprint'), row['host'], row.get('url'),
+                       row.get('expires_at'), record.get('notes'), record.get('line_num'))
+
+    def add_run(self, run: str, parsed_data: Mapping[str, Iterable[Dict[str, Any]]]):
+        """Record the records of a run, in category and record order."""
+        with self.db:
+            self.db.executemany(f"INSERT INTO records ({', '.join(self.COLUMNS)}) "
+                                f"VALUES ({', '.join('?' * len(self.COLUMNS))})", self._rows(run, parsed_data))
+            self.db.execute("INSERT OR IGNORE INTO runs VALUES (?)", (run,))
+
+    def csv(self, name: str) -> Optional[str]:
+        """The content of the CSV `name` (see CSV_VIEWS), None while it has no rows."""
+        import csv
+        view, header = self.CSV_VIEWS[name]
+        rows = self.db.execute(f"SELECT * FROM {view}").fetchall()
+        if not rows:
+            return None
+        out = io.StringIO(newline='')
+        writer = csv.writer(out)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return out.getvalue()
+
+    def query(self, filters: Mapping[str, str], distinct: Optional[str] = None) -> List[Any]:
+        """Records matching every filter (column -> value, a glob if it holds * or ?) as dicts, oldest first.
+
+        With distinct, the distinct non-null values of that column instead.
+        """
+        where, params = [], []
+        for column, value in filters.items():
+            if column not in self.COLUMNS:
+                raise ValueError(f"unknown column: {column}")
+            where.append(f"{column} {'GLOB' if '*' in value or '?' in value else '='} ?")
+            params.append(value)
+        if distinct is not None and distinct not in self.COLUMNS:
+            raise ValueError(f"unknown column: {distinct}")
+        if distinct is not None:
+            where.append(f"{distinct} IS NOT NULL")
+        condition = f" WHERE {' AND '.join(where)}" if where else ''
+        if distinct is not None:
+            return [value for value, in self.db.execute(
+                f"SELECT DISTINCT {distinct} FROM records{condition} ORDER BY {distinct}", params)]
+        cursor = self.db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM records{condition} ORDER BY id", params)
+        return [dict(zip(self.COLUMNS, row)) for row in cursor]
+
+    def close(self):
+        self.db.close()
+
+class Registry:
+    """registry.yaml, loaded once per process and kept indexed in memory.
+
+    The merged registry is the dict written to the file, with sets of the
+    global env names and of each service's env names beside it. A JSON
+    sidecar with the loaded data and the file's signature spares parsing
+    the YAML again while the file is unchanged. Changes mark the registry
+    dirty; save() is only needed when it is.
+    """
+
+    _open: Dict[str, 'Registry'] = {}  # Path -> registry as last loaded or saved by this process
+    _open_lock = threading.Lock()  # Daemon request threads open the registries of their output bases at once
+
+    def __init__(self, path: Path, existing: Optional[Dict[str, Any]] = None, signature: Optional[str] = None):
+        self.path = path
+        self.sidecar = path.with_name(f".{path.stem}.json")
+        self.signature = signature
+        self.data = {
+            "global_env": [],
+            "services": {},
+            "unknown": 0
+        }
+        if existing is not None:
+            self.data['global_env'] = existing.get('global_env', [])
+            self.data['services'] = existing.get('services', {})
+            self.data['unknown'] = existing.get('unknown', 0)
+            if 'ssh' in existing:
+                self.data['ssh'] = existing['ssh']
+        self.services: Dict[str, Dict[str, Any]] = self.data['services']
+        self._global_env = set(self.data['global_env'])
+        self._service_env: Dict[str, set] = {}  # Built per service on first use
+        self._ssh = set(self.data.get('ssh', []))
+        self.dirty = existing is None
+
+    @classmethod
+    def open(cls, path: Path) -> 'Registry':
+        """The registry at path: kept from earlier in the process while the file is unchanged, else loaded."""
+        signature = file_signature(path)
+        with cls._open_lock:
+            registry = cls._open.get(str(path))
+            if registry is None or signature is None or registry.signature != signature:
+                registry = cls._open[str(path)] = cls._load(path, signature)
+        return registry
+
+    @classmethod
+    def _load(cls, path: Path, signature: Optional[str]) -> 'Registry':
+        if signature is None:
+            return cls(path)
+        sidecar = path.with_name(f".{path.stem}.json")
+        try:
+            with open(sidecar, 'r') as f:
+                cached = json.load(f)
+            if cached['signature'] == signature:
+                return cls(path, cached['registry'], signature)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # Missing or stale: parse the file itself
+
+        text = path.read_text()
+        try:
+            yaml = yaml_module()
+            if yaml is None:
+                raise ImportError("PyYAML is not installed")
+            existing = yaml.load(text, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+        except Exception:
+            # If YAML parsing fails, try JSON
+            try:
+                existing = json.loads(text) or {}
+            except Exception:
+                existing = None  # Start fresh if both fail
+        if not isinstance(existing, dict):
+            return cls(path)
+        registry = cls(path, existing, signature)
+        registry._write_sidecar()
+        return registry
+
+    def _write_sidecar(self):
+        try:
+            with atomic_write(self.sidecar) as f:
+                json.dump({'signature': self.signature, 'registry': self.data}, f)
+        except (TypeError, ValueError):
+            pass  # Values JSON cannot hold (e.g. dates typed into the file): always parse the YAML
+
+    def save(self):
+        """Write registry.yaml (JSON if PyYAML is not available) and its sidecar."""
+        try:
+            yaml = yaml_module()
+            if yaml is not None:
+                content = yaml.dump(self.data, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+                                    default_flow_style=False, sort_keys=False)
+            else:
+                # Fallback to JSON with .yaml extension (less ideal but works)
+                content = json.dumps(self.data, indent=2)
+            with atomic_write(self.path) as f:
+                f.write(content)
+            self.signature = file_signature(self.path)
+            self._write_sidecar()
+            self.dirty = False
+        except BaseException:
+            # Reload next time rather than keep changes the file lacks
+            with self._open_lock:
+                self._open.pop(str(self.path), None)
+            raise
+
+    def add_global_env(self, name: str):
+        if name not in self._global_env:
+            self._global_env.add(name)
+            self.data['global_env'].append(name)
+            self.dirty = True
+
+    def add_service(self, service: str):
+        if service not in self.services:
+            self.services[service] = {
+                'env': [],
+                'credentials': 0,
+                'tokens': 0,
+                'endpoints': 0,
+                'ssh': []
+            }
+            self.dirty = True
+
+    def add_service_env(self, service: str, name: str):
+        env = self.services[service]['env']
+        names = self._service_env.get(service)
+        if names is None:
+            names = self._service_env[service] = set(env)
+        if name not in names:
+            names.add(name)
+            env.append(name)
+            self.dirty = True
+
+    def count(self, service: str, category: str, n: int):
+        """Add n to a service's count of credentials, tokens or endpoints."""
+        if n:
+            self.services[service][category] += n
+            self.dirty = True
+
+    def add_ssh(self, path: str):
+        if path not in self._ssh:
+            self._ssh.add(path)
+            self.data.setdefault('ssh', []).append(path)
+            self.dirty = True
+
+    def add_unknown(self, n: int):
+        if n:
+            self.data['unknown'] += n
+            self.dirty = True
+
+class TokenClassifier:
+    """Scores the long tokens of unknown lines as likely secrets, a batch of tokens at a time.
+
+    A token's features are the Shannon entropy of its characters, as a share
+    of the most its length and alphabet allow; the character classes it
+    mixes; its length; and a known key prefix. With NumPy a batch is scored
+    in a few array operations over its bytes, else token by token in Python
+    to the same result; so are inputs with few tokens, which would not repay
+    NumPy's import.
+    """
+
+    TOKEN = re.compile(r'[A-Za-z0-9_+/-]{20,}={0,2}')  # ASCII only, so a token is its bytes
+    BATCH = 8192  # Tokens scored per array call
+    NUMPY_TOKENS = 4096  # Least tokens scored with NumPy
+    # (prefix, service, key name) of keys the engine's API key rules do not cover
+    PREFIXES = [
+        ('sk_live_', 'stripe', 'STRIPE_SECRET_KEY'),
+        ('rk_live_', 'stripe', 'STRIPE_RESTRICTED_KEY'),
+        ('sk_test_', 'stripe', 'STRIPE_TEST_KEY'),
+        ('sk-ant-', 'anthropic', 'ANTHROPIC_API_KEY'),
+        ('AKIA', 'aws', 'AWS_ACCESS_KEY_ID'),
+        ('github_pat_', 'github', 'GITHUB_TOKEN'),
+        ('gho_', 'github', 'GITHUB_TOKEN'),
+        ('ghs_', 'github', 'GITHUB_TOKEN'),
+        ('glpat-', 'gitlab', 'GITLAB_TOKEN'),
+        ('gsk_', 'groq', 'GROQ_API_KEY'),
+        ('hf_', 'huggingface', 'HF_TOKEN'),
+        ('npm_', 'npm', 'NPM_TOKEN'),
+        ('dop_v1_', 'digitalocean', 'DIGITALOCEAN_TOKEN'),
+    ]
+    # Character class bits; NOT_HEX marks a character outside [0-9A-Fa-f]
+    LOWER, UPPER, DIGIT, OTHER, NOT_HEX = 1, 2, 4, 8, 16
+    ALPHABET = {LOWER: 26, UPPER: 26, DIGIT: 10, OTHER: 4}  # Sizes, other: _ + / -
+    # Guesses by kind, weakest first; a line takes its strongest token's
+    KINDS = ['', 'possible_secret', 'token', 'api_key']
+    # Least entropy share of: a key with a known prefix; a token of 32+ characters of both cases
+    # and digits, promoted; one of 20+, a possible secret; and a possible secret in hex, of 32+.
+    # 99% of random base62 tokens score 0.82 or more, identifiers and paths mostly less.
+    KEY_RANDOMNESS = 0.7
+    TOKEN_RANDOMNESS = 0.82
+    POSSIBLE_RANDOMNESS = 0.8
+    HEX_RANDOMNESS = 0.85
+
+    def __init__(self):
+        self.class_bits = [0] * 128
+        for code in range(128):
+            char = chr(code)
+            bits = self.LOWER if 'a' <= char <= 'z' else self.UPPER if 'A' <= char <= 'Z' \
+                else self.DIGIT if char.isdigit() else self.OTHER
+            if char not in '0123456789abcdefABCDEF':
+                bits |= self.NOT_HEX
+            self.class_bits[code] = bits
+        # Alphabet size by class bits; single-case hex digits draw from 16
+        self.alphabets = [sum(size for bit, size in self.ALPHABET.items() if bits & bit) for bits in range(32)]
+        for bits in range(16):
+            if bits & (self.LOWER | self.UPPER) != self.LOWER | self.UPPER and not bits & self.OTHER:
+                self.alphabets[bits] = 16
+
+    def classify(self, lines: List[str], limit: Optional[int] = None) -> Tuple[List[int], List[Tuple[int, str, int]]]:
+        """Kind (index into KINDS) of each line, and (line index, token, prefix index or -1) of each token to promote.
+
+        A token ending a line of `limit` characters may have been cut off with it and is left out.
+        """
+        tokens = []
+        owners = []
+        findall = self.TOKEN.findall
+        for j, line in enumerate(lines):
+            found = findall(line)
+            if found:
+                if limit is not None and len(line) >= limit and line.endswith(found[-1]):
+                    found.pop()
+                tokens.extend(found)
+                owners.extend(repeat(j, len(found)))
+        kinds = [0] * len(lines)
+        promote = []
+        np = numpy_module() if len(tokens) >= self.NUMPY_TOKENS else None
+        score = partial(self._score_arrays, np) if np is not None else self._score_tokens
+        for start in range(0, len(tokens), self.BATCH):
+            batch = tokens[start:start + self.BATCH]
+            token_kinds, prefixes = score(batch)
+            for j, token, kind, prefix in zip(owners[start:start + self.BATCH], batch, token_kinds, prefixes):
+                if kind > kinds[j]:
+                    kinds[j] = kind
+                if kind >= 2:
+                    promote.append((j, token, prefix if kind == 3 else -1))
+        return kinds, promote
+
+    def _score_arrays(self, np, tokens: List[str]) -> Tuple[List[int], List[int]]:
+        """Kind and prefix index of each token, from array operations over the batch's bytes."""
+        n = len(tokens)
+        lengths = np.fromiter(map(len, tokens), np.int64, n)
+        codes = np.frombuffer(''.join(tokens).encode('ascii'), np.uint8)
+        starts = np.zeros(n, np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        # Character counts per token: one row of 128 ASCII codes each
+        counts = np.bincount(np.repeat(np.arange(n) * 128, lengths) + codes, minlength=n * 128).reshape(n, 128)
+        entropy = np.log2(lengths) - (counts * np.log2(np.maximum(counts, 1))).sum(1) / lengths
+        bits = np.bitwise_or.reduceat(np.array(self.class_bits, np.uint8)[codes], starts)
+        alphabet = np.array(self.alphabets)[bits]
+        randomness = np.round(entropy / np.log2(np.minimum(lengths, alphabet)), 6)
+
+        prefix = np.full(n, -1)
+        for k in reversed(range(len(self.PREFIXES))):  # The first listed prefix wins
+            literal = np.frombuffer(self.PREFIXES[k][0].encode(), np.uint8)
+            head = codes[starts[:, None] + np.arange(len(literal))]  # Tokens are longer than any prefix
+            prefix[(head == literal).all(1)] = k
+        prefix_length = np.array([len(literal) for literal, _, _ in self.PREFIXES] + [0])[prefix]
+
+        mixed = bits & (self.LOWER | self.UPPER | self.DIGIT) == self.LOWER | self.UPPER | self.DIGIT
+        kind = np.select([
+            (prefix >= 0) & (lengths >= prefix_length + 12) & (randomness >= self.KEY_RANDOMNESS),
+            mixed & (lengths >= 32) & (randomness >= self.TOKEN_RANDOMNESS),
+            mixed & (randomness >= self.POSSIBLE_RANDOMNESS)
+            | (alphabet == 16) & (bits & self.DIGIT > 0) & (lengths >= 32) & (randomness >= self.HEX_RANDOMNESS),
+        ], [3, 2, 1], 0)
+        return kind.tolist(), prefix.tolist()
+
+    def _score_tokens(self, tokens: List[str]) -> Tuple[List[int], List[int]]:
+        """_score_arrays token by token, without NumPy."""
+        from collections import Counter
+        from math import log2
+        letters_digits = self.LOWER | self.UPPER | self.DIGIT
+        kinds = []
+        prefixes = []
+        for token in tokens:
+            length = len(token)
+            entropy = log2(length) - sum(count * log2(count) for count in Counter(token).values()) / length
+            bits = 0
+            for char in set(token):
+                bits |= self.class_bits[ord(char)]
+            alphabet = self.alphabets[bits]
+            randomness = round(entropy / log2(min(length, alphabet)), 6)
+            prefix = next((k for k, (literal, _, _) in enumerate(self.PREFIXES) if token.startswith(literal)), -1)
+            if prefix >= 0 and length >= len(self.PREFIXES[prefix][0]) + 12 and randomness >= self.KEY_RANDOMNESS:
+                kind = 3
+            elif bits & letters_digits == letters_digits and length >= 32 and randomness >= self.TOKEN_RANDOMNESS:
+                kind = 2
+            elif bits & letters_digits == letters_digits and randomness >= self.POSSIBLE_RANDOMNESS \
+                    or alphabet == 16 and bits & self.DIGIT and length >= 32 and randomness >= self.HEX_RANDOMNESS:
+                kind = 1
+            else:
+                kind = 0
+            kinds.append(kind)
+            prefixes.append(prefix)
+        return kinds, prefixes
+
+
+class TableLayout:
+    """Column layout of a credential table, inferred once from its header row.
+
+    Header cells are read as role, username, email or password columns;
+    in an email table, the columns between the email and the password are
+    service flags (`Email Address  Coolify  n8n  Password`). A row with as
+    many cells as the header maps cell for cell, as does one that only
+    lacks cells after the columns read. In other rows, where empty cells
+    collapsed, the columns before the flags count from the left and the
+    others from the right. The share of rows that map cell for cell is the
+    table's confidence.
+    """
+
+    def __init__(self, cells: List[str], line_num: int):
+        lowered = [cell.lower() for cell in cells]
+        self.cells = cells
+        self.line_num = line_num
+        self.email = any('email' in cell for cell in lowered)
+        kinds = []
+        for cell in lowered:
+            if 'password' in cell and 'password' not in kinds:
+                kinds.append('password')
+            elif 'email' in cell:
+                kinds.append('email')
+            elif 'username' in cell or cell in ('user', 'login'):
+                kinds.append('username')
+            elif 'role' in cell:
+                kinds.append('role')
+            else:
+                kinds.append('other')
+        self.password = kinds.index('password')
+        identity = [c for c, kind in enumerate(kinds) if kind == ('email' if self.email else 'username')]
+        # Else, in a role/password table, the first unnamed column; rows without one add no credentials
+        identity = identity or [c for c, kind in enumerate(kinds) if kind == 'other']
+        self.identity: Optional[int] = identity[0] if identity else None
+        if self.email and self.identity is not None:
+            low, high = sorted((self.identity, self.password))
+            kinds[low + 1:high] = ['flag' if kind == 'other' else kind for kind in kinds[low + 1:high]]
+        self.kinds = kinds
+        self.width = len(cells)
+        split = kinds.index('flag') if 'flag' in kinds else self.width
+        used = [c for c in (self.identity, self.password) if c is not None]
+        self.left = [c for c in used if c < split]
+        self.trailing = len(self.left) == len(used)  # Rows may lack only cells after every used one
+        need = max([c + 1 for c in self.left] or [0]) + max([self.width - c for c in used if c >= split] or [0])
+        # Wider tables never took two-cell rows for rows of their own; see _scan_table_rows
+        self.min_cells = max(need, min(3, self.width))
+        self.rows = 0
+        self.matched = 0
+
+    @classmethod
+    def infer(cls, cells: List[str], line_num: int) -> Optional['TableLayout']:
+        """The layout of a table with these header cells, or None if they do not head a credential table."""
+        lowered = [cell.lower() for cell in cells]
+        # A cell naming both ("# Username/password pairs") describes a line, not a column
+        named = [cell for cell in lowered if 'password' not in cell]
+        has_role_or_username = any('role' in cell or 'username' in cell for cell in named)
+        has_email = any('email' in cell for cell in named)
+        if (has_role_or_username or has_email) and len(named) < len(lowered):
+            return cls(cells, line_num)
+        return None
+
+    def locate(self, parts: List[str]) -> Optional[Tuple[str, str]]:
+        """(identity, password) cells of a row, or None if it has too few cells for this layout."""
+        n = len(parts)
+        if n < self.min_cells:
+            return None
+        if n == self.width or n < self.width and self.trailing:
+            self.matched += 1
+            identity, password = self.identity, self.password
+        else:
+            identity = self.identity if self.identity in self.left or self.identity is None \
+                else self.identity - self.width
+            password = self.password if self.password in self.left else self.password - self.width
+        return '' if identity is None else parts[identity], parts[password]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"line_num": self.line_num, "columns": self.kinds, "header": self.cells, "rows": self.rows,
+                "confidence": round(self.matched / self.rows, 3) if self.rows else 0.0}
+
+
 class SecretsParser:
-    def __init__(self, output_base: str = "secrets"):
+    STREAM_BLOCK = 8192  # Lines classified per block by parse_stream
+    STREAM_LOOKBEHIND = 2  # Context lines before a credential
+    STREAM_LOOKAHEAD = 50  # Lines read past each block, as context for its last lines
+    CHUNKS_PER_WORKER = 4  # parse_parallel chunks per pool process, for load balance
+    CHECKPOINT_BYTES = 1 << 18  # Input tail searched for a resume checkpoint
+
+    def __init__(self, output_base: str = "secrets", engine: Optional[ScanEngine] = None, rescan: bool = False,
+                 catalog: Optional[ServiceCatalog] = None):
+        # The directories and fingerprint database are created by the first stage that writes
         self.output_base = Path(output_base)
-        self.output_base.mkdir(exist_ok=True)
         self.intake_dir = self.output_base / "_intake"
-        self.intake_dir.mkdir(exist_ok=True)
         self.global_dir = self.output_base / "global"
-        self.global_dir.mkdir(exist_ok=True)
         self.ssh_dir = self.global_dir / "ssh"
-        self.ssh_dir.mkdir(exist_ok=True)
         self.services_dir = self.output_base / "services"
-        self.services_dir.mkdir(exist_ok=True)
-        
-        self.parsed_data = {
-            "api_keys": [],
-            "credentials": [],
-            "tokens": [],
-            "db_uris": [],
-            "ssh": [],
-            "env_vars": [],
-            "endpoints": [],
-            "unknown": []
-        }
+        
+        self._init_parse(engine or default_engine(), catalog or ServiceCatalog.load(self.output_base / "services.yaml"),
+                         {category: RecordStore(columns, RECORD_INDEXES[category])
+                          for category, columns in RECORD_COLUMNS.items()},
+                         ValueInterner(load_fingerprint_key(self.output_base)), rescan)
+
+    def _init_parse(self, engine: ScanEngine, catalog: ServiceCatalog, parsed_data: Dict[str, Any],
+                    interner: ValueInterner, rescan: bool = False):
+        """Set up the state of a parse held in memory; every parser, writing or not, starts with this."""
+        self.engine = engine
+        self.catalog = catalog
+        self.parsed_data = parsed_data
         self.value_hashes = {}  # For deduplication: hash -> best entry
-        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+        self.interner = interner  # Value fingerprints and masks
+        self.ssh_keys: Dict[str, str] = {}  # Key files to write: name under global/ssh -> key block
+        self.rescan = rescan  # Reprocess values already recorded by earlier runs
+        self._lines = None  # Line locator of the input being parsed (TextLines, MappedLineBuffer)
+        self.main_stop = None  # Line number of the credential line that ended the main pass
+        self._classified = 0  # Unknown records classify_unknown has seen
+        self.recorded_unknown = 0  # Unknown lines whose key or token classify_unknown recorded
+        self.inputs = []  # Fingerprints of the inputs being parsed (see fingerprint_input)
+        self.batch = None  # Per-file stats of parse_batch
+        self.tables: List[Dict[str, Any]] = []  # Layout and confidence of each credential table (TableLayout.stats)
+        self.timestamp = time.strftime("%Y%m%d_%H%M")  # The run id, made unique by _raw_file
+        self._run_claimed = False
+        self.pool: Optional['Executor'] = None  # Shared process pool for chunk parsing (daemon mode)
+        self.write_lock: Optional[threading.Lock] = None  # Taken for the run's deduplication and writes
+        self._write_locked = False
+
+    @cached_property
+    def fingerprints(self) -> FingerprintIndex:
+        """The FingerprintIndex of the output base, opened on first use."""
+        self.output_base.mkdir(parents=True, exist_ok=True)
+        return FingerprintIndex(self.output_base / "fingerprints.db")
+
+    @cached_property
+    def inventory(self) -> Inventory:
+        """The Inventory of the output base, opened on first use."""
+        return Inventory.open(self.output_base)
+
+    def use_keyed_fingerprints(self):
+        """Fingerprint values with keyed BLAKE2b from now on, under a new random key of the output base.
+
+        The key is kept in FINGERPRINT_KEY_FILE (mode 0600), and every later
+        run on the output base picks it up. Only possible before values are
+        recorded: their SHA-256 fingerprints would no longer match.
+        """
+        if self.interner.key is not None:
+            return
+        if (self.output_base / "fingerprints.db").exists() and self.fingerprints.has_fingerprints():
+            raise ValueError(f"{self.output_base} already holds SHA-256 value fingerprints; "
+                             "keyed fingerprints can only be enabled in a new output base")
+        key = os.urandom(32)
+        self.output_base.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.output_base / FINGERPRINT_KEY_FILE, mode=0o600) as f:
+            f.write(key.hex() + '\n')
+        self.interner = ValueInterner(key)
+
+    def make_dirs(self):
+        """Create the output directories; done by the stages that write, so a run that does not write creates none."""
+        for directory in (self.intake_dir, self.ssh_dir, self.services_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def _raw_file(self) -> Path:
+        """The raw intake file of this run, in a created intake directory.
+
+        The first call claims the file by creating it, so that runs started in
+        the same minute, in this process or another, each get their own run
+        id: the timestamp gets a suffix _2, _3, ... while the file is taken.
+        """
+        if self._run_claimed:
+            return self.intake_dir / f"{self.timestamp}_raw.txt"
+        self.make_dirs()
+        stamp, n = self.timestamp, 1
+        while True:
+            raw_file = self.intake_dir / f"{self.timestamp}_raw.txt"
+            try:
+                os.close(os.open(raw_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            except FileExistsError:
+                n += 1
+                self.timestamp = f"{stamp}_{n}"
+                continue
+            self._run_claimed = True
+            return raw_file
     
     def _parse_tab_separated_tables(self, lines: List[str]):
         """Parse tab-separated credential tables (Role/Username/Password or Email/Password format)."""
@@ -163,23 +2024,786 @@ class SecretsParser:
                     break
             
             i += 1
-    
+
+    def _scan_tables(self, lines: List[str], tags: List[int], start: int = 0, offset: int = 0,
+                     final: bool = True, rows: Optional[TableLayout] = None) -> Tuple[int, Optional[TableLayout]]:
+        """Compiled-engine counterpart of _parse_tab_separated_tables, reading each table by its header's layout.
+
+        Scans lines[start:]; `offset` is the line number of lines[0] minus one.
+        Returns (next index, rows): when a non-final block ends inside a table,
+        rows is the table's layout so the next block resumes its rows.
+        """
+        engine = self.engine
+        n = len(lines)
+        i = start
+        while True:
+            if rows is not None:
+                i = self._scan_table_rows(lines, tags, i, rows, offset)
+                if i >= n and not final:
+                    return i, rows
+                self._add_table(rows.stats())
+                rows = None
+            if i >= n:
+                return i, None
+            t = tags[i]
+            if not t & (engine.table_header_bits | engine.email_bits | engine.service_pass_bits):
+                i += 1
+                continue
+            line = lines[i].strip()
+
+            # Look for table headers
+            if t & engine.table_header_bits and engine.table_header.search(line):
+                rows = TableLayout.infer(engine.table_split.split(line), offset+i+1)
+                if rows is not None:
+                    i += 1
+                    continue
+
+            # Also check for email:password pattern
+            if t & engine.email_bits:
+                email_pass_match = engine.email_pass.search(line)
+                if email_pass_match:
+                    email = email_pass_match.group(1)
+                    password = email_pass_match.group(2)
+                    if password and password not in ['☐', '✅']:
+                        service = self._guess_service_from_email(email)
+                        self._add_credential(email, password, service, line, offset+i+1)
+
+            # Service-specific password patterns
+            if t & engine.service_pass_bits:
+                for pattern, service, username, generic in engine.service_pass_rules:
+                    match = pattern.search(line)
+                    if match:
+                        if generic:
+                            self._add_service_password(match, line, offset+i+1)
+                        else:
+                            username_val = username
+                            if not username_val and i > 0:
+                                username_val = self._username_from_previous_line(lines[i-1].strip())
+                            self._add_credential(username_val, match.group(1), service or 'unknown', line, offset+i+1)
+                        break
+
+            i += 1
+
+    def _scan_table_rows(self, lines: List[str], tags: List[int], i: int, layout: TableLayout,
+                         offset: int = 0) -> int:
+        """Parse the data rows under a table header; return the index of the first non-row line.
+
+        Rows are split and located by the layout first, up to the end of the
+        table, then added in order, in batches whose values are checked
+        against earlier runs at once. The header of another table ends this
+        one.
+        """
+        engine = self.engine
+        split = engine.table_split.split
+        password_bits = engine.password_bits  # Every table header has a password column
+        n = len(lines)
+        rows = []  # (line index, line, username or email, password, from an email column)
+        while i < n:
+            data_line = lines[i].strip()
+            if not data_line or data_line[0] in '#☐✅':
+                i += 1
+                continue
+
+            parts = split(data_line)
+            if tags[i] & password_bits and engine.table_header.search(data_line) \
+                    and TableLayout.infer(parts, 0) is not None:
+                break
+            cells = layout.locate(parts)
+            if cells is not None:
+                layout.rows += 1
+                identity, password = cells
+                if layout.email:
+                    # Email format: email | service flags | password
+                    if '@' in identity:
+                        rows.append((i, data_line, identity, password, True))
+                elif identity:
+                    # Role/Username/Password format
+                    rows.append((i, data_line, identity, password, False))
+            elif len(parts) == 2 and '@' in parts[0]:
+                # Email/password pair without extra columns
+                layout.rows += 1
+                rows.append((i, data_line, parts[0], parts[1], True))
+            else:
+                break
+            i += 1
+
+        rows = [row for row in rows if row[3] and row[3] not in ('☐', '✅')]
+        for start in range(0, len(rows), 4096):  # Within the interner's cache, so values are hashed once
+            batch = rows[start:start + 4096]
+            self._prefetch_seen(row[3] for row in batch)
+            for j, data_line, identity, password, email in batch:
+                service = self._guess_service_from_email(identity) if email \
+                    else self._guess_service_from_context([data_line])
+                self._add_credential(identity, password, service, data_line, offset+j+1)
+        return i
+
+    def _prefetch_seen(self, values: Iterable[str]):
+        """Look values up in the fingerprint index at once, ahead of the _seen calls of their additions."""
+        if self.rescan:
+            return
+        values = list(values)
+        if values:
+            self.hold_writes()  # As _seen does before its lookups
+            prefetch = getattr(self.fingerprints, 'prefetch', None)
+            if prefetch is not None:
+                prefetch(map(self.interner.fingerprint, values))
+
+    def _add_table(self, stats: Dict[str, Any]):
+        self.tables.append(stats)
+
+    def _add_service_password(self, match: 're.Match', source_line: str, line_num: int):
+        """Record a SERVICE_PASSWORD_<NAME> line as an API key or credential."""
+        service_name = match.group(1).lower()
+        value = match.group(2)
+        if 'APIKEY' in match.group(1):
+            self._add_api_key(value, service_name.replace('apikey', ''), f'{service_name.upper()}_API_KEY', source_line, line_num)
+        else:
+            self._add_credential('', value, service_name, source_line, line_num)
+
+    def _username_from_previous_line(self, prev_line: str) -> str:
+        """Find the email or username a password line refers to on the line above it."""
+        email_match = self.engine.email.search(prev_line)
+        if email_match:
+            return email_match.group(1)
+        user_match = self.engine.prev_user.search(prev_line)
+        if user_match:
+            return user_match.group(1)
+        return ''
+
     def _guess_service_from_email(self, email: str) -> str:
         """Guess service from email address."""
-        email_lower = email.lower()
-        if 'dev' in email_lower or 'dev01' in email_lower or 'dev02' in email_lower:
-            return 'development'
-        elif 'employee' in email_lower:
-            return 'internal'
-        elif 'admin' in email_lower:
-            return 'admin'
-        elif 'confersolutions' in email_lower or 'confer' in email_lower:
-            return 'confer'
-        return 'unknown'
+        return self.catalog.email_service(email)
         
     def parse_raw_text(self, raw_text: str) -> Dict[str, Any]:
         """Parse raw text dump into structured data."""
         lines = raw_text.split('\n')
+        tags = self.engine.tag_lines(lines)
+        self._lines = TextLines(raw_text, lines)
+
+        # First, detect and parse tab-separated credential tables
+        self._scan_tables(lines, tags)
+        self._scan_lines(lines, tags)
+        self._lines = None
+        self.classify_unknown()
+        return self.parsed_data
+
+    def parse_stream(self, source: Iterable[str]) -> Dict[str, Any]:
+        """Parse a text stream in bounded memory.
+
+        The input is copied to the raw intake file while credential tables are
+        parsed, then read back from it for the main pass through a small sliding
+        window, so both passes see the same lines as parse_raw_text. Records are
+        spooled to disk under the intake directory instead of held in memory.
+        """
+        self._spool_parsed_data()
+        raw_file = self._raw_file()
+        with open(raw_file, 'w') as tee:
+            self._stream_tables(LineBuffer(iter_lines(source, tee), self.engine))
+        with open(raw_file, 'r') as f:
+            self._stream_lines(LineBuffer(iter_lines(f), self.engine))
+        self.classify_unknown()
+        return self.parsed_data
+
+    def parse_file(self, path: str, spool: bool = False) -> Dict[str, Any]:
+        """Parse a dump file through a read-only memory map.
+
+        Lines are scanned as bytes and only decoded when a rule may match;
+        unknown lines keep offsets into the map (SourceRef) until written.
+        The file is copied to the raw intake file, so call write_outputs()
+        without raw_text afterwards. With spool=True records go to disk as in
+        parse_stream.
+        """
+        path = Path(path)
+        raw_file = self._raw_file()
+        encoding = locale.getpreferredencoding(False)
+        mapped = None
+        if codecs.lookup(encoding).name in MappedFile.ENCODINGS and path.stat().st_size > 0:
+            mapped = MappedFile(path, encoding)
+            if mapped.newline is None:
+                mapped.buf.close()
+                mapped = None
+        if mapped is None:
+            # Text mode for other encodings, empty files and mixed line endings
+            with open(path, 'r') as f:
+                if spool:
+                    return self.parse_stream(f)
+                raw_text = f.read()
+            raw_file.write_text(raw_text)
+            return self.parse_raw_text(raw_text)
+
+        import shutil
+        if mapped.newline == b'\n':
+            shutil.copyfile(path, raw_file)
+        else:
+            # Keep the raw intake identical to what text mode reads
+            with open(path, 'r') as src, open(raw_file, 'w') as dst:
+                shutil.copyfileobj(src, dst)
+        if spool:
+            self._spool_parsed_data()
+        tag_cache = array('I')
+        # Records and their SourceRefs never form cycles; skip the collector
+        # passes their allocation would otherwise trigger.
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            self._lines = MappedLineBuffer(mapped, self.engine, tag_cache)
+            self._stream_tables(self._lines)
+            self._lines = MappedLineBuffer(mapped, self.engine, tag_cache)
+            self._stream_lines(self._lines)
+        finally:
+            self._lines = None
+            if collecting:
+                gc.enable()
+        self.classify_unknown()
+        return self.parsed_data
+
+    def fingerprint_input(self, path: str) -> Dict[str, Any]:
+        """Digest a dump file and match it against the inputs of earlier runs.
+
+        Returns {'digest', 'size', 'lines', 'path', 'run', 'resume'}: 'run'
+        names the run that already ingested identical content, and 'resume' is
+        the checkpoint to parse from when the file only grew since its last run
+        (see parse_tail). Unless skipped as already ingested, the input is
+        added to self.inputs, which write_outputs records with a checkpoint.
+        """
+        return self.fingerprint_inputs([path])[0]
+
+    def fingerprint_inputs(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """fingerprint_input for several files, digested concurrently.
+
+        hashlib releases the GIL while digesting large blocks, so the files
+        of a batch are read and hashed on threads; their lookups run here.
+        """
+        self._backfill_inputs()
+        paths = [str(Path(path).resolve()) for path in paths]
+        previous = [self.fingerprints.last_input(path) for path in paths]
+        if len(paths) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(min(len(paths), os.cpu_count() or 1)) as pool:
+                digests = list(pool.map(self._digest_file, paths, previous))
+        else:
+            digests = list(map(self._digest_file, paths, previous))
+
+        intakes = []
+        for path, before, (digest, prefix, size, lines) in zip(paths, previous, digests):
+            resume = None
+            if before is not None and prefix == before[1] and before[2] is not None:
+                resume = before[2]
+            intakes.append(self._add_input({'digest': digest, 'size': size, 'lines': lines, 'path': path,
+                                            'run': self.fingerprints.find_input(digest), 'resume': resume}))
+        return intakes
+
+    @staticmethod
+    def _digest_file(path: str, previous: Optional[Tuple[int, str, Any]]
+                     ) -> Tuple[str, Optional[str], int, Optional[int]]:
+        """(digest, digest of the previous version's bytes, size, line count) of a file.
+
+        previous is its last_input; the line count is None with \\r line endings.
+        """
+        digest = hashlib.sha256()
+        prefix = None  # Digest of the bytes the previous version had
+        size = lines = 0
+        carriage = False  # \r line endings are left to full parses
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(MappedFile.BLOCK_BYTES)
+                if not block:
+                    break
+                if previous is not None and size <= previous[0] < size + len(block):
+                    cut = previous[0] - size
+                    digest.update(block[:cut])
+                    prefix = digest.hexdigest()
+                    digest.update(block[cut:])
+                else:
+                    digest.update(block)
+                size += len(block)
+                lines += block.count(b'\n')
+                carriage = carriage or b'\r' in block
+        return digest.hexdigest(), prefix, size, None if carriage else lines
+
+    def fingerprint_text(self, raw_text: str) -> Dict[str, Any]:
+        """fingerprint_input for a dump read from stdin; it can be skipped but not resumed."""
+        self._backfill_inputs()
+        data = raw_text.encode('utf-8', 'surrogateescape')
+        digest = hashlib.sha256(data).hexdigest()
+        return self._add_input({'digest': digest, 'size': len(data), 'lines': None, 'path': None,
+                                'run': self.fingerprints.find_input(digest), 'resume': None})
+
+    @staticmethod
+    def _file_digest(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(MappedFile.BLOCK_BYTES), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _add_input(self, intake: Dict[str, Any]) -> Dict[str, Any]:
+        if intake['run'] is None or self.rescan:
+            self.inputs.append(intake)
+        return intake
+
+    def _backfill_inputs(self):
+        """Digest the raw intake files of runs from before inputs were recorded."""
+        if self.fingerprints.has_inputs():
+            return
+        for raw_file in sorted(self.intake_dir.glob('*_raw.txt')):
+            data = raw_file.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            self.fingerprints.add_input(digest, len(data), None, raw_file.name[:-len('_raw.txt')], digest)
+
+    def parse_tail(self, path: str, resume: Tuple[int, int, int, bool]) -> Dict[str, Any]:
+        """Parse only what follows a checkpoint of fingerprint_input in a grown dump file.
+
+        The checkpoint (offset, line, before, scan) is a safe boundary of the
+        earlier content (see _boundaries) preceded by `before` context lines
+        starting at byte `offset`, the start of line `line` + 1. Lines from the
+        boundary on are parsed as parse_raw_text would in the whole file; the
+        main pass only runs if it had not stopped before the boundary. Records
+        keep whole-file line numbers. The new lines are copied to the raw
+        intake file, so call write_outputs() without raw_text afterwards.
+        """
+        offset, line, before, scan = resume
+        text = self._read_tail(path, offset)
+        lines = text.split('\n')
+        tags = self.engine.tag_lines(lines)
+        tail = sum(map(len, lines[:before])) + before
+        self._raw_file().write_text(text[tail:])
+        self._lines = TextLines(text, lines, line)
+
+        self._scan_tables(lines, tags, before, line)
+        if scan:
+            self._scan_lines(lines, tags, before, None, line)
+        else:
+            self.main_stop = 0
+        self._lines = None
+        self.classify_unknown()
+        return self.parsed_data
+
+    def _read_tail(self, path: str, offset: int) -> str:
+        """Text of a dump file from byte `offset` on, as text mode would read it."""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            text = f.read().decode(locale.getpreferredencoding(False))
+        if '\r' in text:
+            # The checkpointed lines have no \r, so newlines can be translated from here
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+    def parse_batch(self, paths: List[str], workers: int = 1) -> List[Dict[str, Any]]:
+        """Parse several dump files into one deduplicated result, in a pool of `workers` processes.
+
+        Each file is parsed as on its own: skipped when already ingested,
+        resumed when only appended to (see fingerprint_input), with its own
+        table and main passes. Records are merged in the order of `paths`, so
+        earlier files win deduplication. The raw intake file holds the parsed
+        text of the files one after another and record line numbers count
+        through it, so call write_outputs() without raw_text afterwards.
+        Returns per-file stats {'path', 'status', 'lines', 'records', 'unknown', 'seconds'},
+        also kept for the parse report.
+        """
+        self.batch = []
+        texts, tasks, shifts = [], [], []
+        base = 0  # Raw intake lines taken by earlier files
+        for path, intake in zip(paths, self.fingerprint_inputs(paths)):
+            stats = {'path': path, 'status': 'parsed', 'lines': 0, 'records': 0, 'unknown': 0, 'seconds': 0.0}
+            self.batch.append(stats)
+            if intake['run'] and not self.rescan:
+                stats['status'] = 'skipped'
+                continue
+            line, before, scan = 0, 0, True
+            if intake['resume'] and not self.rescan:
+                offset, line, before, scan = intake['resume']
+                text = self._read_tail(path, offset)
+                stats['status'] = 'resumed'
+            else:
+                with open(path, 'r') as f:
+                    text = f.read()
+            start = 0
+            for _ in range(before):
+                start = text.index('\n', start) + 1
+            size = text.count('\n', start) + 1
+            texts.append(text[start:])
+            tasks.append((text, before, size, base - before, True, scan))
+            shifts.append((stats, intake, line + before - base, scan))
+            stats['lines'] = size
+            base += size
+        raw_text = '\n'.join(texts)
+        if texts:
+            self._raw_file().write_text(raw_text)
+        del texts
+
+        # As in parse_parallel, the acyclic records need no collector passes
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            if workers > 1 and len(tasks) > 1:
+                results = self._map_tasks(_parse_timed, tasks, min(workers, len(tasks)))
+            else:
+                results = [_parse_timed(task, self.catalog, self.engine) for task in tasks]
+            del tasks
+
+            self._lines = TextLines(raw_text, raw_text.split('\n'))
+            for (stats, intake, shift, scan), (chunk, seconds) in zip(shifts, results):
+                table_events, line_events, unknown_nums, main_stop = chunk
+                records = sum(map(len, self.parsed_data.values()))
+                self._replay(table_events)
+                self._replay(line_events)
+                for line_num in unknown_nums:
+                    self._add_unknown(self._lines.ref(line_num), line_num)
+                stats['unknown'] = len(unknown_nums)
+                stats['records'] = sum(map(len, self.parsed_data.values())) - records - len(unknown_nums)
+                stats['seconds'] = seconds
+                # In whole-file line numbers, for the input's checkpoint
+                if not scan:
+                    intake['main_stop'] = 0
+                else:
+                    intake['main_stop'] = None if main_stop is None else main_stop + shift
+        finally:
+            self._lines = None
+            if collecting:
+                gc.enable()
+        self.classify_unknown()
+        return self.batch
+
+    def _checkpoint(self, intake: Dict[str, Any], main_stop: Optional[int]) -> Optional[Tuple[int, int, int, bool]]:
+        """Where a later run may resume an input once data is appended to it.
+
+        Looks for the last safe boundary among the final CHECKPOINT_BYTES of
+        the input, which has to end with a newline so that the boundary is
+        final. main_stop is where the input's main pass ended, if it did.
+        """
+        encoding = locale.getpreferredencoding(False)
+        if intake['lines'] is None or codecs.lookup(encoding).name not in MappedFile.ENCODINGS:
+            return None
+        size = intake['size']
+        start = max(0, size - self.CHECKPOINT_BYTES)
+        with open(intake['path'], 'rb') as f:
+            f.seek(start)
+            data = f.read(size - start)
+        # Whole lines only: drop a partial first line and anything after the last newline
+        cut = data.find(b'\n') + 1 if start else 0
+        end = data.rfind(b'\n') + 1
+        if end <= cut:
+            return None
+        text = data[cut:end].decode(encoding)
+        boundary = -1
+        # The window's end may be a boundary too
+        for boundary in self._boundaries(text + '\n', 0, partial=bool(start)):
+            pass
+        if boundary == -1:
+            return None
+
+        context = boundary
+        for _ in range(self.STREAM_LOOKBEHIND):
+            if context == 0:
+                break
+            context = text.rfind('\n', 0, context - 1) + 1
+        before = text.count('\n', context, boundary)
+        line = intake['lines'] - text.count('\n', context)
+        scan = main_stop is None or main_stop > line + before
+        return start + cut + len(text[:context].encode(encoding)), line, before, scan
+
+    def _map_tasks(self, function, tasks: List[tuple], workers: int) -> List[Any]:
+        """Map a chunk entry point over tasks in self.pool if set (daemon mode), else in a new pool."""
+        if self.pool is not None:
+            return list(self.pool.map(partial(function, catalog=self.catalog), tasks))
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.catalog,)) as pool:
+            return list(pool.map(function, tasks))
+
+    def parse_parallel(self, raw_text: str, workers: int) -> Dict[str, Any]:
+        """Parse raw text in a pool of `workers` processes; same result as parse_raw_text.
+
+        The text is cut into chunks at safe boundaries (see _boundaries)
+        and each worker classifies one chunk plus its context lines, logging the
+        records it would add. The logs are replayed here in input order, table
+        pass first and then the main pass up to the first credential line, so
+        deduplication and line numbers match a serial run.
+        """
+        tasks = self._chunk_tasks(raw_text, workers * self.CHUNKS_PER_WORKER)
+        if len(tasks) == 1:
+            return self.parse_raw_text(raw_text)
+        # As in parse_file, the acyclic records need no collector passes
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            results = self._map_tasks(_parse_chunk, tasks, workers)
+
+            self._lines = TextLines(raw_text, raw_text.split('\n'))
+            for table_events, _, _, _ in results:
+                self._replay(table_events)
+            for _, line_events, unknown_nums, main_stop in results:
+                self._replay(line_events)
+                for line_num in unknown_nums:
+                    self._add_unknown(self._lines.ref(line_num), line_num)
+                if main_stop is not None:
+                    self.main_stop = main_stop
+                    break
+        finally:
+            self._lines = None
+            if collecting:
+                gc.enable()
+        self.classify_unknown()
+        return self.parsed_data
+
+    def _chunk_tasks(self, text: str, count: int) -> List[Tuple[str, int, int, int, bool]]:
+        """Cut text into at most `count` chunks at safe boundaries.
+
+        Each task is (text, before, size, offset, last): the chunk's `size`
+        lines preceded by `before` context lines and followed by lookahead
+        lines, with `offset` the line number of its first line minus one.
+        """
+        length = len(text)
+        starts = [0]
+        for k in range(1, count):
+            start = self._find_boundary(text, max(length * k // count, starts[-1] + 1))
+            if start == -1:
+                break
+            starts.append(start)
+
+        tasks = []
+        line = 0  # Line index of starts[k]
+        for k, start in enumerate(starts):
+            last = k == len(starts) - 1
+            end = length if last else starts[k+1]
+            context = start
+            for _ in range(self.STREAM_LOOKBEHIND):
+                if context == 0:
+                    break
+                context = text.rfind('\n', 0, context - 1) + 1
+            before = text.count('\n', context, start)
+            lookahead = end
+            for _ in range(self.STREAM_LOOKAHEAD):
+                if lookahead >= length:
+                    break
+                lookahead = text.find('\n', lookahead)
+                lookahead = length if lookahead == -1 else lookahead + 1
+            size = text.count('\n', start, end) + (1 if last else 0)
+            tasks.append((text[context:lookahead], before, size, line - before, last))
+            line += size
+        return tasks
+
+    def _find_boundary(self, text: str, pos: int) -> int:
+        """Offset of the first line start after `pos` where both passes can restart cleanly, or -1."""
+        return next(self._boundaries(text, pos), -1)
+
+    def _boundaries(self, text: str, pos: int, partial: bool = False) -> Iterator[int]:
+        """Yield the line starts after `pos` where both passes can restart cleanly.
+
+        The line before each must end any credential table without starting one
+        and must not be a username line whose password may follow, and no PEM
+        block may be open after it, since the block skip could jump past the
+        boundary. A `partial` text may start inside a block.
+        """
+        engine = self.engine
+        body = engine.pem_body.fullmatch
+        start = text.rfind('\n', 0, pos) + 1
+        # Whether a PEM block is open at `start`: its body lines lead back to a header
+        back = start
+        while True:
+            if back == 0:
+                open_block = partial
+                break
+            prev = text.rfind('\n', 0, back - 1) + 1
+            line = text[prev:back].strip()
+            if not body(line):
+                open_block = self._opens_block(line)
+                break
+            back = prev
+
+        while True:
+            end = text.find('\n', start)
+            if end == -1:
+                return
+            line = text[start:end]
+            t = engine.tag(line)
+            start = end + 1
+            if open_block:
+                stripped = line.strip()
+                open_block = body(stripped) is not None
+                if not open_block and '-----' in stripped and engine.pem_end.search(stripped):
+                    continue  # The block's END line
+            if t & engine.ssh_bits and self._opens_block(line.strip()):
+                open_block = True
+            if open_block or t & engine.username_bits or start >= len(text):
+                continue
+            line = line.strip()
+            if not line or line.startswith('#') or engine.table_checkbox.search(line):
+                continue
+            if len(engine.table_split.split(line)) == 1 and not engine.table_header.search(line):
+                yield start
+
+    def _opens_block(self, line: str) -> bool:
+        """Whether `line` holds a PEM BEGIN header with no END after it (see _pem_block)."""
+        header = self.engine.ssh_header.search(line)
+        return header is not None and not self.engine.pem_end.search(line, header.end())
+
+    def _replay(self, events: List[Tuple[str, tuple]]):
+        """Apply record additions logged by a ChunkParser."""
+        for method, args in events:
+            getattr(self, method)(*args)
+
+    def _spool_parsed_data(self):
+        """Back every parsed_data category with a RecordSpool."""
+        self.make_dirs()
+        for category, items in self.parsed_data.items():
+            if not isinstance(items, RecordSpool):
+                spool = RecordSpool(self.intake_dir, items.fields)
+                for item in items:
+                    spool.append(item)
+                self.parsed_data[category] = spool
+
+    def _stream_tables(self, window: LineBuffer):
+        """Run _scan_tables block by block, keeping one line of lookbehind."""
+        i, rows = 0, None
+        while True:
+            final = window.fill(i - window.base + self.STREAM_BLOCK)
+            i, rows = self._scan_tables(window.lines, window.tags, i - window.base, window.base, final, rows)
+            i += window.base
+            if final:
+                return
+            window.release(i - 1)
+
+    def _stream_lines(self, window: LineBuffer):
+        """Run _scan_lines block by block over a window of lookbehind and lookahead lines.
+
+        A PEM block longer than the window stops the scan at its header; the
+        window then grows until the block fits.
+        """
+        i = 0
+        grow = 0
+        while True:
+            start = i - window.base
+            final = window.fill(start + self.STREAM_BLOCK + self.STREAM_LOOKAHEAD + grow)
+            stop = None if final else start + self.STREAM_BLOCK
+            resume = self._scan_lines(window.lines, window.tags, start, stop, window.base, window.plain,
+                                      more=not final)
+            if resume is None or final:
+                return
+            resume += window.base
+            grow = (grow * 2 or self.STREAM_BLOCK) if resume == i else 0
+            i = resume
+            window.release(i - self.STREAM_LOOKBEHIND)
+
+    def _scan_lines(self, lines: List[str], tags: List[int], start: int = 0, stop: Optional[int] = None,
+                    offset: int = 0, plain=None, more: bool = False) -> Optional[int]:
+        """Classify lines with the compiled engine; the successor of the parse_raw_text_legacy loop.
+
+        Scans positions start..stop; lines past stop are only read as lookahead.
+        `plain(i, stop)`, when given, handles runs of lines without triggers
+        (see MappedLineBuffer.plain) so they are never decoded.
+        Returns the index to resume from, or None once the scan has ended.
+        With `more` set, lines follow the window, and the scan returns early at
+        a PEM block that runs past it.
+        """
+        engine = self.engine
+        n = len(lines)
+        stop = n if stop is None else stop
+        i = start
+        while i < stop:
+            if plain is not None and not tags[i]:
+                i, sources = plain(i, stop)
+                for j, source in sources:
+                    self._add_unknown(source, offset+j+1)
+                continue
+            line = lines[i].strip()
+            if not line or line.startswith('#'):
+                i += 1
+                continue
+            t = tags[i]
+
+            ssh_match = engine.ssh_header.search(line) if t & engine.ssh_bits else None
+            pem = self._pem_block(lines, i, line, ssh_match) if ssh_match else None
+            if pem is not None and pem[0] == -1 and more:
+                return i
+
+            # API Keys / Tokens
+            if t & engine.api_key_bits:
+                for pattern, bits, service, key_name in engine.api_key_rules:
+                    if t & bits:
+                        match = pattern.search(line)
+                        if match:
+                            value = match.group(1) if pattern.groups else match.group(0)
+                            self._add_api_key(value, service, key_name, line, offset+i+1)
+                            break
+
+            # Username/Password pairs
+            user_match = engine.username.search(line) if t & engine.username_bits else None
+            pass_match = engine.password.search(line) if t & engine.password_bits else None
+            if user_match or pass_match:
+                username = user_match.group(1) if user_match else None
+                password = pass_match.group(1) if pass_match else None
+
+                # Check next line if password not found
+                if username and not password and i + 1 < n and tags[i+1] & engine.password_bits:
+                    next_match = engine.password.search(lines[i+1])
+                    if next_match:
+                        password = next_match.group(1)
+
+                service = self._guess_service_from_context(lines[max(0, i-2):i+3])
+                self._add_credential(username, password, service, line, offset+i+1)
+                # The reference loop leaves the scan at the first credential line
+                self.main_stop = offset+i+1
+                return None
+
+            # DB URIs
+            db_match = engine.db_uri.search(line) if t & engine.db_uri_bits else None
+            if db_match:
+                self._add_db_uri(db_match.group(3), db_match.group(1).lower(), line, offset+i+1)
+
+            # PEM blocks: SSH keys, certificates, PGP armor
+            if pem is not None and pem[0] != -1:
+                end, label, key_block = pem
+                self._add_ssh_key(key_block, label, line, offset+i+1)
+                # Skip lines in the block
+                i = end
+
+            # Env vars
+            env_match = engine.env_var.search(line) if t & engine.env_var_bits else None
+            if env_match:
+                line_lower = line.lower()
+                if not any(p in line_lower for p in ['password', 'secret', 'key', 'token']):
+                    self._add_env_assignment(env_match.group(1), env_match.group(2), line, offset+i+1)
+
+            # Traefik basic auth (bcrypt hashes)
+            if t & engine.traefik_bits:
+                traefik_match = engine.traefik.search(line)
+                if traefik_match:
+                    self._add_traefik_users(traefik_match.group(1), line, offset+i+1)
+                    i += 1
+                    continue
+
+            # Endpoints
+            endpoint_match = engine.endpoint.search(line) if t & engine.endpoint_bits else None
+            if endpoint_match:
+                url = endpoint_match.group(1)
+                self._add_endpoint(url, self._guess_service_from_url(url), line, offset+i+1)
+
+            # Unknown
+            if not (db_match or env_match or endpoint_match or ssh_match):
+                self._add_unknown(line, offset+i+1)
+
+            i += 1
+        return i if i < n or more else None
+
+    def _add_traefik_users(self, users_str: str, source_line: str, line_num: int):
+        """Store each user:bcrypt pair of a traefik basicauth label as a token."""
+        # Split on comma followed by word (username:) pattern
+        for user_pair in self.engine.traefik_users.split(users_str.strip()):
+            user_pair = user_pair.strip()
+            if ':' in user_pair and '$2' in user_pair:
+                username, bcrypt_hash = user_pair.split(':', 1)
+                # Store bcrypt hash as a token (can't reverse it)
+                self._add_token(bcrypt_hash.strip(), 'traefik', 'bcrypt', username.strip(), source_line, line_num)
+
+    def parse_raw_text_legacy(self, raw_text: str) -> Dict[str, Any]:
+        """The original implementation: one re.search per rule per line.
+
+        Kept for reference only. parse_raw_text has since changed what it
+        reads (tables by their header's layout, see TableLayout; PEM blocks
+        of any length and label, see _pem_block), so results differ.
+        """
+        lines = raw_text.split('\n')
         
         # First, detect and parse tab-separated credential tables
         self._parse_tab_separated_tables(lines)
@@ -308,70 +2932,63 @@ class SecretsParser:
         
         return self.parsed_data
     
+    def _pem_block(self, lines: List[str], i: int, line: str, header: re.Match) -> Optional[Tuple[int, str, str]]:
+        """Read the PEM block whose BEGIN header matched `line`, the stripped lines[i].
+
+        One pass over the block's lines, of any number: returns (index of the
+        END line, label, block), or None if a line that is neither base64 nor
+        an armor header comes first. The index is -1 if the lines run out.
+        """
+        engine = self.engine
+        label = ' '.join(header.group(1).upper().split())
+        end = engine.pem_end.search(line, header.end())
+        if end:
+            return i, label, line[header.start():end.end()]
+        body = engine.pem_body.fullmatch
+        for j in range(i + 1, len(lines)):
+            text = lines[j].strip()
+            if '-----' in text:
+                end = engine.pem_end.search(text)
+                if end is None:
+                    return None
+                block = [line[header.start():]]
+                block.extend(body_line.strip() for body_line in lines[i+1:j])
+                block.append(text[:end.end()])
+                return j, label, '\n'.join(block)
+            if not body(text):
+                return None
+        return -1, label, ''
+
     def _extract_ssh_key_block(self, lines: List[str]) -> Optional[str]:
-        """Extract complete SSH key block."""
+        """Extract complete SSH key block (parse_raw_text_legacy)."""
         text = '\n'.join(lines)
-        match = re.search(r'-----BEGIN.*?KEY-----\s*(.*?)\s*-----END.*?KEY-----', text, re.DOTALL)
+        match = self.engine.ssh_block.search(text)
         return match.group(0) if match else None
     
     def _guess_service_from_context(self, context: List[str]) -> str:
         """Guess service from surrounding context."""
-        text = ' '.join(context).lower()
-        services = ['openai', 'groq', 'qdrant', 'neo4j', 'vercel', 'coolify', 'github', 'replit', 'clerk', 'n8n', 'flowise', 'postgres', 'mysql', 'redis']
-        for svc in services:
-            if svc in text:
-                return svc
-        return 'unknown'
+        return self.catalog.context_service(context)
     
     def _guess_service_from_key(self, key: str) -> Optional[str]:
         """Guess service from env var key name."""
-        key_lower = key.lower()
-        mapping = {
-            'openai': 'openai',
-            'groq': 'groq',
-            'qdrant': 'qdrant',
-            'neo4j': 'neo4j',
-            'vercel': 'vercel',
-            'coolify': 'coolify',
-            'github': 'github',
-            'replit': 'replit',
-            'clerk': 'clerk',
-            'n8n': 'n8n',
-            'flowise': 'flowise',
-            'postgres': 'postgres',
-            'mysql': 'mysql',
-            'redis': 'redis',
-        }
-        for svc, name in mapping.items():
-            if svc in key_lower:
-                return name
-        return None
+        return self.catalog.key_service(key)
     
     def _guess_service_from_url(self, url: str) -> str:
         """Guess service from URL."""
-        url_lower = url.lower()
-        mapping = {
-            'openai.com': 'openai',
-            'groq.com': 'groq',
-            'qdrant.io': 'qdrant',
-            'neo4j.com': 'neo4j',
-            'vercel.com': 'vercel',
-            'coolify.io': 'coolify',
-            'github.com': 'github',
-            'replit.com': 'replit',
-            'clerk.com': 'clerk',
-            'api.openai.com': 'openai',
-            'api.groq.com': 'groq',
-        }
-        for domain, service in mapping.items():
-            if domain in url_lower:
-                return service
-        return 'unknown'
+        return self.catalog.url_service(url)
     
+    def _seen(self, value_hash: str) -> bool:
+        """Whether a value was already recorded in this run or, unless rescanning, in an earlier one."""
+        if not self._write_locked and self.write_lock is not None:
+            self.hold_writes()
+        if value_hash in self.value_hashes:
+            return True
+        return not self.rescan and value_hash in self.fingerprints
+
     def _add_api_key(self, value: str, service: Optional[str], key_name: Optional[str], source_line: str, line_num: int):
         """Add API key with deduplication."""
-        value_hash = hash_value(value)
-        if value_hash in self.value_hashes:
+        value_hash = self.interner.fingerprint(value)
+        if self._seen(value_hash):
             return  # Already seen
         
         self.value_hashes[value_hash] = value
@@ -384,9 +3001,9 @@ class SecretsParser:
         entry = {
             "service": service or "unknown",
             "key_name": key_name,
-            "value_masked": mask_secret(value),
+            "value_masked": self.interner.mask(value),
             "value_hash": value_hash,
-            "source_line": source_line[:100],  # Truncate
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num,
             "notes": ""
         }
@@ -395,17 +3012,17 @@ class SecretsParser:
     def _add_credential(self, username: Optional[str], password: Optional[str], service: str, source_line: str, line_num: int):
         """Add credential with deduplication."""
         if password:
-            value_hash = hash_value(password)
-            if value_hash in self.value_hashes:
+            value_hash = self.interner.fingerprint(password)
+            if self._seen(value_hash):
                 return
             self.value_hashes[value_hash] = password
         
         entry = {
             "service": service or "unknown",
             "username": username or "",
-            "password_masked": mask_secret(password) if password else "",
+            "password_masked": self.interner.mask(password) if password else "",
             "url": "",
-            "source_line": source_line[:100],
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num,
             "notes": ""
         }
@@ -413,84 +3030,99 @@ class SecretsParser:
     
     def _add_db_uri(self, uri: str, service: str, source_line: str, line_num: int):
         """Add DB URI with deduplication."""
-        value_hash = hash_value(uri)
-        if value_hash in self.value_hashes:
+        value_hash = self.interner.fingerprint(uri)
+        if self._seen(value_hash):
             return
         self.value_hashes[value_hash] = uri
         
         # Parse URI
-        match = re.search(r'://([^:]+):([^@]+)@([^/]+)/(.+)', uri)
+        match = self.engine.db_uri_parts.search(uri)
         username = match.group(1) if match else None
         host = match.group(3) if match else None
         dbname = match.group(4).split('?')[0] if match else None
         
         entry = {
             "service": service,
-            "uri_masked": mask_secret(uri),
+            "uri_masked": self.interner.mask(uri),
             "uri_hash": value_hash,
             "username": username or "",
             "host": host or "",
             "dbname": dbname or "",
-            "source_line": source_line[:100],
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num,
             "notes": ""
         }
         self.parsed_data["db_uris"].append(entry)
     
-    def _add_ssh_key(self, key_block: str, key_type: str, source_line: str, line_num: int):
-        """Add SSH key."""
-        value_hash = hash_value(key_block)
-        if value_hash in self.value_hashes:
+    # Key file extension by PEM label word, first match wins
+    PEM_EXTENSIONS = [('PRIVATE', '.key'), ('PUBLIC', '.pub'), ('CERTIFICATE', '.crt'), ('PGP', '.asc')]
+
+    def _add_ssh_key(self, key_block: str, label: str, source_line: str, line_num: int):
+        """Add a PEM block (SSH key, certificate, PGP armor) labelled `label`.
+
+        Its key file is named after the label and the block's fingerprint, so
+        distinct blocks never share a file.
+        """
+        value_hash = self.interner.fingerprint(key_block)
+        if self._seen(value_hash):
             return
         self.value_hashes[value_hash] = key_block
-        
-        key_type_lower = key_type.lower()
-        filename = f"id_rsa_{'private' if 'PRIVATE' in key_type_lower else 'public'}.{'key' if 'PRIVATE' in key_type_lower else 'pub'}"
-        
+
+        words = label.split()
+        key_type = 'PRIVATE' if 'PRIVATE' in words else 'PUBLIC' if 'PUBLIC' in words else label
+        extension = next((ext for word, ext in self.PEM_EXTENSIONS if word in words), '.pem')
+        filename = f"{'_'.join(words).lower()}_{value_hash}{extension}"
+
         entry = {
             "type": key_type,
+            "label": label,
             "path_written": f"global/ssh/{filename}",
             "comment": "",
-            "source_line": source_line[:100],
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num
         }
         self.parsed_data["ssh"].append(entry)
         
-        # Write SSH key file
-        ssh_path = self.ssh_dir / filename
-        ssh_path.write_text(key_block)
-        ssh_path.chmod(0o600)  # Secure permissions
+        # Written by write_outputs
+        self.ssh_keys[filename] = key_block
     
     def _add_env_var(self, key: str, value: str, service: Optional[str], scope: str, source_line: str, line_num: int):
         """Add env var with deduplication."""
-        value_hash = hash_value(value)
-        if value_hash in self.value_hashes:
+        value_hash = self.interner.fingerprint(value)
+        if self._seen(value_hash):
             return
         self.value_hashes[value_hash] = value
         
         entry = {
             "service": service or "",
             "name": key,
-            "value_masked": mask_secret(value),
+            "value_masked": self.interner.mask(value),
             "value_hash": value_hash,
             "scope": scope,
-            "source_line": source_line[:100],
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num,
             "notes": ""
         }
         self.parsed_data["env_vars"].append(entry)
     
+    def _add_env_assignment(self, key: str, value: str, source_line: str, line_num: int):
+        """Add a KEY=value line as an env var unless the value is already an API key."""
+        if not self.parsed_data['api_keys'].has('masked', self.interner.mask(value)):
+            service = self._guess_service_from_key(key)
+            scope = 'service' if service else 'global'
+            self._add_env_var(key, value, service, scope, source_line, line_num)
+
     def _add_endpoint(self, url: str, service: str, source_line: str, line_num: int):
         """Add endpoint with deduplication."""
-        value_hash = hash_value(url)
-        if value_hash in self.value_hashes:
+        value_hash = self.interner.fingerprint(url)
+        if self._seen(value_hash):
             return
         self.value_hashes[value_hash] = url
         
         entry = {
             "service": service,
             "url": url,
-            "source_line": source_line[:100],
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num,
             "notes": ""
         }
@@ -498,74 +3130,232 @@ class SecretsParser:
     
     def _add_token(self, value: str, service: str, token_type: str, username: Optional[str], source_line: str, line_num: int):
         """Add token (bearer tokens, bcrypt hashes, etc.) with deduplication."""
-        value_hash = hash_value(value)
-        if value_hash in self.value_hashes:
+        value_hash = self.interner.fingerprint(value)
+        if self._seen(value_hash):
             return
         self.value_hashes[value_hash] = value
         
         entry = {
             "service": service,
             "token_type": token_type,
-            "value_masked": mask_secret(value),
+            "value_masked": self.interner.mask(value),
             "value_hash": value_hash,
             "username": username or "",
             "expires_at": "",
-            "source_line": source_line[:100],
+            "source_line": self._source_line(source_line, line_num, 100),
             "line_num": line_num,
             "notes": ""
         }
         self.parsed_data["tokens"].append(entry)
     
+    def _source_line(self, line: str, line_num: int, limit: int):
+        """Source of a record: a reference into the input when its lines are located, else the text."""
+        if self._lines is not None:
+            return self._lines.ref(line_num, limit)
+        return line[:limit]
+
     def _add_unknown(self, line: str, line_num: int):
         """Add unknown/unclassified line."""
         entry = {
-            "raw_line": line[:200],  # Truncate
+            "raw_line": self._source_line(line, line_num, 200),
             "line_num": line_num,
             "guess": ""
         }
         self.parsed_data["unknown"].append(entry)
     
-    def write_outputs(self, raw_text: str):
-        """Write all output files."""
-        # 1. Save raw intake
-        raw_file = self.intake_dir / f"{self.timestamp}_raw.txt"
-        raw_file.write_text(raw_text)
-        
-        # 2. Write parsed JSON
+    def classify_unknown(self):
+        """Guess what the unknown lines hold, and record the secrets among them (see TokenClassifier).
+
+        The last step of every parse method, over the unknown lines added
+        since the previous call. A line's guess is the kind of its strongest
+        token. Keys with a known prefix become API keys and other
+        random-looking tokens bearer tokens; their lines stay in unknown,
+        guessed 'api_key' or 'token', for review, and are counted in
+        recorded_unknown.
+        """
+        unknown = self.parsed_data['unknown']
+        classifier = TokenClassifier()
+        limit = dict(RECORD_COLUMNS['unknown'])['raw_line']
+        guesses = {}
+        position = self._classified
+        rows = islice(unknown.select('raw_line', 'line_num'), position, None)
+        while True:
+            batch = list(islice(rows, 65536))
+            if not batch:
+                break
+            lines = [str(line) for line, _ in batch]  # Spooled heads may hold SourceRefs
+            kinds, promote = classifier.classify(lines, limit)
+            for j, kind in enumerate(kinds):
+                if kind:
+                    guesses[position + j] = TokenClassifier.KINDS[kind]
+            self.recorded_unknown += sum(kind >= 2 for kind in kinds)  # Kinds 'token' and 'api_key' are promoted
+            self._prefetch_seen(token for _, token, _ in promote)
+            for j, token, prefix in promote:
+                line, line_num = lines[j], batch[j][1]
+                if prefix >= 0:
+                    _, service, key_name = TokenClassifier.PREFIXES[prefix]
+                    self._add_api_key(token, service, key_name, line, line_num)
+                else:
+                    self._add_token(token, self._guess_service_from_context([line]), 'high_entropy', None,
+                                    line, line_num)
+            position += len(batch)
+        self._classified = position
+        if guesses:
+            unknown.update('guess', guesses)
+
+    def write_outputs(self, raw_text: Optional[str] = None):
+        """Write the output files this run affects.
+
+        raw_text may be omitted after parse_stream, which saves the raw intake itself.
+        Files are replaced atomically, except the CSVs and .env.global, which
+        are appended to, and independent files are written concurrently.
+        Service files and registry.yaml are only written when their content
+        changes.
+        """
+        self.hold_writes()
+        raw_file = self._raw_file()
+        self.inventory  # Opened before this run's snapshot is written, which a new inventory is built from
         json_file = self.intake_dir / f"{self.timestamp}_parsed.json"
-        with open(json_file, 'w') as f:
-            json.dump(self.parsed_data, f, indent=2)
-        
-        # 3. Write parse report (masked)
         report_file = self.intake_dir / f"{self.timestamp}_parse_report.md"
-        self._write_report(report_file)
-        
-        # 4. Write global .env.global
-        self._write_global_env()
-        
-        # 5. Write CSVs
-        self._write_csvs()
-        
-        # 6. Write service-specific .env files
-        self._write_service_envs()
-        
-        # 7. Write registry.yaml
-        self._write_registry()
-        
-        # 8. Update README
-        self._update_readme()
+        profile_file = self.intake_dir / f"{self.timestamp}_profile.json"
+        profiler = getattr(self.engine, 'profiler', None)
+        from concurrent.futures import ThreadPoolExecutor
+        self._written: List[Tuple[Path, str]] = []
+        with ThreadPoolExecutor() as self._pool:
+            self._writes: List['Future'] = []
+            try:
+                # 1. Save raw intake
+                if raw_text is not None:
+                    self._write_file(raw_file, raw_text)
+
+                # 2. Write parsed JSON
+                self._writes.append(self._pool.submit(self._write_parsed_json, json_file))
+
+                # 3. Write parse report (masked), and the rule profile if profiling
+                self._writes.append(self._pool.submit(self._write_report, report_file))
+                if profiler is not None:
+                    self._write_file(profile_file, json.dumps(profiler.to_dict(), indent=2) + '\n')
+
+                # SSH key files (secure permissions), in one task
+                if self.ssh_keys:
+                    self._writes.append(self._pool.submit(self._write_ssh_keys))
+
+                # 4. Record the run in the inventory, and regenerate the CSVs from it
+                self.inventory.add_run(self.timestamp, self.parsed_data)
+                self._write_csvs()
+
+                # 5. Append to global .env.global (on this thread, which owns the fingerprint index)
+                self._write_global_env()
+
+                # 6. Write service-specific .env files
+                self._write_service_envs()
+
+                # 7. Write registry.yaml
+                registry = self._write_registry()
+
+                # 8. Update README
+                self._update_readme(registry)
+            finally:
+                for write in self._writes:
+                    write.result()
+        self.fingerprints.add_outputs(self._written)
+
+        # 9. Remember this run's values for the next ones
+        self.fingerprints.add(self.value_hashes, self.timestamp)
+        raw_digest = self._file_digest(raw_file) if self.inputs else None
+        for intake in self.inputs:
+            # An input parsed on its own stopped where this parser's main pass did
+            checkpoint = self._checkpoint(intake, intake.get('main_stop', self.main_stop))
+            self.fingerprints.add_input(intake['digest'], intake['size'], intake['path'], self.timestamp,
+                                        raw_digest, checkpoint)
+        self.release_writes()
         
-        return {
+        outputs = {
             "raw_file": str(raw_file),
             "json_file": str(json_file),
             "report_file": str(report_file)
         }
+        if profiler is not None:
+            outputs["profile_file"] = str(profile_file)
+        return outputs
+
+    def hold_writes(self):
+        """Take the write lock, if any, unless this run holds it already.
+
+        A run holds it from its first check against earlier runs until
+        write_outputs has recorded it, so no other run sharing the lock
+        writes to the output base in between.
+        """
+        if not self._write_locked and self.write_lock is not None:
+            self.write_lock.acquire()
+            self._write_locked = True
+
+    def release_writes(self):
+        """Release the write lock if this run holds it; write_outputs does once done."""
+        if self._write_locked:
+            self._write_locked = False
+            self.write_lock.release()
+
+    def _write_file(self, file_path: Path, content: str, tracked: bool = False):
+        """Queue an atomic write of content to file_path during write_outputs.
+
+        A tracked file is skipped while it holds this content, as last written
+        by a run and untouched since.
+        """
+        if tracked:
+            digest = hashlib.sha256(content.encode()).hexdigest()
+            if self.fingerprints.unchanged(file_path, digest):
+                return
+            self._written.append((file_path, digest))
+        self._writes.append(self._pool.submit(self._replace_file, file_path, content))
+
+    @staticmethod
+    def _replace_file(file_path: Path, content: str, mode: Optional[int] = None):
+        with atomic_write(file_path, mode=mode) as f:
+            f.write(content)
+
+    def _write_ssh_keys(self):
+        """Write the key files of this run's PEM blocks; a file already present holds the same block."""
+        for filename, key_block in self.ssh_keys.items():
+            path = self.ssh_dir / filename
+            if not path.exists():
+                self._replace_file(path, key_block + '\n', 0o600)
+
+    def persist(self, result: 'ParseResult', raw_text: Optional[str] = None) -> Dict[str, str]:
+        """Write a SecretsClassifier result as this parser's run; see write_outputs.
+
+        The result's records replace this parser's. Values earlier runs
+        ingested are only left out if the classifier was given this output
+        base's fingerprints as `known`.
+        """
+        for category, items in result.records.items():
+            store = self.parsed_data[category] = RecordStore(RECORD_COLUMNS[category], RECORD_INDEXES[category])
+            store.extend(map(dict, items))
+        self.value_hashes = dict(result.values)
+        self.ssh_keys = dict(result.ssh_keys)
+        self.main_stop = result.main_stop
+        return self.write_outputs(raw_text)
+    
+    def _write_parsed_json(self, file_path: Path):
+        """Write parsed_data as json.dump(indent=2) would, one record at a time."""
+        encoder = RecordEncoder()
+        with atomic_write(file_path) as f:
+            f.write('{')
+            for c, (category, items) in enumerate(self.parsed_data.items()):
+                f.write(f'{"," if c else ""}\n  {json.dumps(category)}: [')
+                count = 0
+                for item in items:
+                    f.write(',\n    ' if count else '\n    ')
+                    f.write(encoder.encode_record(item, '    '))
+                    count += 1
+                f.write('\n  ]' if count else ']')
+            f.write('\n}' if self.parsed_data else '}')
     
     def _write_report(self, file_path: Path):
         """Write human-readable parse report (masked)."""
         lines = [
             f"# Secrets Parse Report - {self.timestamp}\n",
-            f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n",
             "## Summary\n",
             f"- API Keys: {len(self.parsed_data['api_keys'])}",
             f"- Credentials: {len(self.parsed_data['credentials'])}",
@@ -576,110 +3366,116 @@ class SecretsParser:
             f"- Endpoints: {len(self.parsed_data['endpoints'])}",
             f"- Unknown: {len(self.parsed_data['unknown'])}\n",
         ]
+
+        if self.batch is not None:
+            lines.append("## Inputs\n")
+            lines.append("| File | Status | Lines | Records | Unknown | Seconds |")
+            lines.append("|------|--------|-------|---------|---------|---------|")
+            for stats in self.batch:
+                lines.append(f"| {stats['path']} | {stats['status']} | {stats['lines']} | {stats['records']} "
+                             f"| {stats['unknown']} | {stats['seconds']:.2f} |")
+            lines.append("")
+
+        if self.tables:
+            lines.append("## Credential Tables\n")
+            lines.append("| Line | Columns | Rows | Confidence |")
+            lines.append("|------|---------|------|------------|")
+            for table in self.tables:
+                columns = ', '.join(f"{cell} ({kind})" for cell, kind in zip(table['header'], table['columns']))
+                columns = columns.replace('|', '\\|')
+                lines.append(f"| {table['line_num']} | {columns} | {table['rows']} | {table['confidence']:.0%} |")
+            lines.append("")
+
+        profiler = getattr(self.engine, 'profiler', None)
+        if profiler is not None:
+            profile = profiler.to_dict()
+            lines.append("## Rule Profile\n")
+            lines.append("| Rule | Evaluations | Hits | Time (ms) | µs/eval |")
+            lines.append("|------|-------------|------|-----------|---------|")
+            for rule in profile['rules']:
+                per_eval = rule['seconds'] / rule['evaluations'] * 1e6 if rule['evaluations'] else 0.0
+                lines.append(f"| {rule['rule']} | {rule['evaluations']} | {rule['hits']} "
+                             f"| {rule['seconds'] * 1e3:.1f} | {per_eval:.1f} |")
+            never = [rule['rule'] for rule in profile['rules'] if not rule['hits']]
+            if never:
+                lines.append(f"\nNever matched: {', '.join(never)}")
+            if profile['slowest']:
+                lines.append("\n### Slowest Evaluations\n")
+                lines.append("| Rule | Time (ms) | Length | Line (masked) |")
+                lines.append("|------|-----------|--------|---------------|")
+                for slow in profile['slowest']:
+                    line = slow['line'].replace('|', '\\|')
+                    lines.append(f"| {slow['rule']} | {slow['seconds'] * 1e3:.3f} | {slow['length']} | `{line}` |")
+            lines.append("")
         
         # Details by category
         for category, items in self.parsed_data.items():
             if items:
                 lines.append(f"## {category.replace('_', ' ').title()}\n")
-                for item in items[:20]:  # Limit to 20 per category
+                for item in islice(items, 20):  # Limit to 20 per category
                     if category == 'api_keys':
                         lines.append(f"- {item['service']}: {item['key_name']} = {item['value_masked']}")
                     elif category == 'credentials':
                         lines.append(f"- {item['service']}: {item['username']} / {item['password_masked']}")
                     elif category == 'unknown':
-                        lines.append(f"- Line {item['line_num']}: {item['raw_line'][:80]}")
+                        guess = f" ({item['guess']})" if item['guess'] else ""
+                        lines.append(f"- Line {item['line_num']}: {item['raw_line'][:80]}{guess}")
                 if len(items) > 20:
                     lines.append(f"\n... and {len(items) - 20} more\n")
                 lines.append("")
         
-        file_path.write_text('\n'.join(lines))
+        self._replace_file(file_path, '\n'.join(lines))
     
     def _write_global_env(self):
         """Append to global .env.global file."""
         env_file = self.global_dir / ".env.global"
         
-        # Load existing entries to avoid duplicates
+        # Keys already in the file: from the fingerprint index while the file
+        # is unchanged since the last run, else loaded from the file itself
         existing_keys = set()
-        if env_file.exists():
-            with open(env_file, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        if '=' in line:
-                            key = line.split('=')[0]
-                            existing_keys.add(key)
-        
-        # Append new entries
-        with open(env_file, 'a') as f:
-            # Add API keys
-            for item in self.parsed_data['api_keys']:
-                key_name = item['key_name']
-                if key_name not in existing_keys:
-                    value = self.value_hashes[item['value_hash']]
-                    f.write(f"{key_name}={value}\n")
-                    existing_keys.add(key_name)
-            
-            # Add global env vars
-            for item in self.parsed_data['env_vars']:
-                if item['scope'] == 'global' and item['name'] not in existing_keys:
-                    value = self.value_hashes[item['value_hash']]
-                    f.write(f"{item['name']}={value}\n")
-                    existing_keys.add(item['name'])
+        tracked = self.fingerprints.tracks(env_file)
+        if tracked:
+            in_file = self.fingerprints.has_env_key
+        else:
+            if env_file.exists():
+                with open(env_file, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line and not line.startswith('#'):
+                            if '=' in line:
+                                key = line.split('=')[0]
+                                existing_keys.add(key)
+            self.fingerprints.reset_env_keys(existing_keys)
+            in_file = existing_keys.__contains__
+        
+        # New entries: API keys, then global env vars
+        added = []
+        for item in self.parsed_data['api_keys']:
+            key_name = item['key_name']
+            if key_name not in existing_keys and not in_file(key_name):
+                existing_keys.add(key_name)
+                added.append((key_name, self.value_hashes[item['value_hash']]))
+        
+        for item in self.parsed_data['env_vars']:
+            if item['scope'] == 'global' and item['name'] not in existing_keys and not in_file(item['name']):
+                existing_keys.add(item['name'])
+                added.append((item['name'], self.value_hashes[item['value_hash']]))
+
+        if added:
+            with open(env_file, 'a') as f:
+                f.writelines(f"{key}={value}\n" for key, value in added)
+        if added or not tracked:
+            self.fingerprints.add_env_keys([key for key, _ in added], env_file)
     
     def _write_csvs(self):
-        """Append to CSV files."""
-        # Credentials - append if file exists, write header if new
-        if self.parsed_data['credentials']:
-            cred_file = self.global_dir / "credentials.csv"
-            file_exists = cred_file.exists()
-            with open(cred_file, 'a', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['service', 'username', 'password_masked', 'url', 'notes'])
-                if not file_exists:
-                    writer.writeheader()
-                for item in self.parsed_data['credentials']:
-                    writer.writerow({
-                        'service': item['service'],
-                        'username': item['username'],
-                        'password_masked': item['password_masked'],
-                        'url': item.get('url', ''),
-                        'notes': item.get('notes', '')
-                    })
-        
-        # Tokens - append if file exists, write header if new
-        if self.parsed_data['tokens']:
-            token_file = self.global_dir / "tokens.csv"
-            file_exists = token_file.exists()
-            with open(token_file, 'a', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['service', 'token_type', 'value_masked', 'expires_at', 'notes'])
-                if not file_exists:
-                    writer.writeheader()
-                for item in self.parsed_data['tokens']:
-                    writer.writerow({
-                        'service': item.get('service', ''),
-                        'token_type': item.get('token_type', ''),
-                        'value_masked': item.get('value_masked', ''),
-                        'expires_at': item.get('expires_at', ''),
-                        'notes': item.get('notes', '')
-                    })
-        
-        # Endpoints - append if file exists, write header if new
-        if self.parsed_data['endpoints']:
-            endpoint_file = self.global_dir / "endpoints.csv"
-            file_exists = endpoint_file.exists()
-            with open(endpoint_file, 'a', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['service', 'url', 'region', 'notes'])
-                if not file_exists:
-                    writer.writeheader()
-                for item in self.parsed_data['endpoints']:
-                    writer.writerow({
-                        'service': item['service'],
-                        'url': item['url'],
-                        'region': '',
-                        'notes': item.get('notes', '')
-                    })
+        """Regenerate the CSV files this run adds rows to from the inventory's views."""
+        for name, category in (("credentials.csv", 'credentials'), ("tokens.csv", 'tokens'),
+                               ("endpoints.csv", 'endpoints')):
+            if self.parsed_data[category]:
+                self._write_file(self.global_dir / name, self.inventory.csv(name), tracked=True)
     
     def _write_service_envs(self):
-        """Write service-specific .env.local files."""
+        """Write service-specific .env.local files and READMEs whose content changed."""
         services = defaultdict(list)
         
         # Group env vars by service
@@ -694,11 +3490,13 @@ class SecretsParser:
             env_file = service_dir / ".env.local"
             lines = [f"# {service} service-specific environment variables\n", "# DO NOT COMMIT - This file is git-ignored\n"]
             
+            # Merged into the keys already in the file: values of earlier runs are deduplicated out of this one
+            values = self._read_env_file(env_file)
             for item in items:
-                value = self.value_hashes[item['value_hash']]
-                lines.append(f"{item['name']}={value}")
+                values[item['name']] = self.value_hashes[item['value_hash']]
+            lines.extend(f"{name}={value}" for name, value in values.items())
             
-            env_file.write_text('\n'.join(lines))
+            self._write_file(env_file, '\n'.join(lines), tracked=True)
             
             # Write service README
             readme_file = service_dir / "README.md"
@@ -713,142 +3511,86 @@ This directory contains service-specific environment variables for {service}.
 ## Normalized Keys
 
 """
-            for item in items:
-                readme_content += f"- `{item['name']}`\n"
+            readme_content += ''.join(f"- `{name}`\n" for name in values)
             
-            readme_file.write_text(readme_content)
+            self._write_file(readme_file, readme_content, tracked=True)
+
+    @staticmethod
+    def _read_env_file(env_file: Path) -> Dict[str, str]:
+        """The KEY=value entries of an env file, in file order; empty if there is none."""
+        values = {}
+        if env_file.exists():
+            with open(env_file, 'r') as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    if line and not line.startswith('#') and '=' in line:
+                        key, value = line.split('=', 1)
+                        values[key] = value
+        return values
     
-    def _write_registry(self):
-        """Update registry.yaml, merging with existing data."""
-        registry_file = self.output_base / "registry.yaml"
-        
-        # Load existing registry if it exists
-        registry = {
-            "global_env": [],
-            "services": {},
-            "unknown": 0
-        }
-        
-        if registry_file.exists():
-            try:
-                import yaml
-                with open(registry_file, 'r') as f:
-                    existing = yaml.safe_load(f) or {}
-                    registry['global_env'] = existing.get('global_env', [])
-                    registry['services'] = existing.get('services', {})
-                    registry['unknown'] = existing.get('unknown', 0)
-            except Exception:
-                # If YAML parsing fails, try JSON
-                import json
-                try:
-                    with open(registry_file, 'r') as f:
-                        existing = json.load(f) or {}
-                        registry['global_env'] = existing.get('global_env', [])
-                        registry['services'] = existing.get('services', {})
-                        registry['unknown'] = existing.get('unknown', 0)
-                except Exception:
-                    pass  # Start fresh if both fail
+    def _write_registry(self) -> Registry:
+        """Merge this run into registry.yaml and return the merged registry.
+
+        The file is written in the background, and only if the run changed it.
+        """
+        registry = Registry.open(self.output_base / "registry.yaml")
         
         # Add new global env keys
-        for item in self.parsed_data['api_keys']:
-            if item['key_name'] not in registry['global_env']:
-                registry['global_env'].append(item['key_name'])
+        for key_name in self.parsed_data['api_keys'].distinct('key'):
+            registry.add_global_env(key_name)
         
         for item in self.parsed_data['env_vars']:
-            if item['scope'] == 'global' and item['name'] not in registry['global_env']:
-                registry['global_env'].append(item['name'])
+            if item['scope'] == 'global':
+                registry.add_global_env(item['name'])
         
         # Add new services and update counts
-        services_seen = set()
         for category in ['api_keys', 'credentials', 'tokens', 'db_uris', 'env_vars', 'endpoints']:
-            for item in self.parsed_data[category]:
-                service = item.get('service', 'unknown')
-                if service != 'unknown' and service not in services_seen:
-                    services_seen.add(service)
-                    if service not in registry['services']:
-                        registry['services'][service] = {
-                            'env': [],
-                            'credentials': 0,
-                            'tokens': 0,
-                            'endpoints': 0,
-                            'ssh': []
-                        }
+            for service in self.parsed_data[category].distinct('service'):
+                if service != 'unknown':
+                    registry.add_service(service)
         
         # Update service data with new items
         for item in self.parsed_data['env_vars']:
             service = item.get('service')
-            if service and service in registry['services']:
-                if item['name'] not in registry['services'][service]['env']:
-                    registry['services'][service]['env'].append(item['name'])
-        
-        for item in self.parsed_data['credentials']:
-            service = item.get('service')
-            if service and service in registry['services']:
-                registry['services'][service]['credentials'] += 1
-        
-        for item in self.parsed_data['tokens']:
-            service = item.get('service')
-            if service and service in registry['services']:
-                registry['services'][service]['tokens'] += 1
+            if service and service in registry.services:
+                registry.add_service_env(service, item['name'])
         
-        for item in self.parsed_data['endpoints']:
-            service = item.get('service')
-            if service and service in registry['services']:
-                registry['services'][service]['endpoints'] += 1
+        for category in ['credentials', 'tokens', 'endpoints']:
+            for service, positions in self.parsed_data[category].indexes['service'].items():
+                if service and service in registry.services:
+                    registry.count(service, category, len(positions))
         
         for item in self.parsed_data['ssh']:
             service = item.get('service', 'global')
             if service == 'global':
-                if 'ssh' not in registry:
-                    registry['ssh'] = []
-                if item['path_written'] not in registry['ssh']:
-                    registry['ssh'].append(item['path_written'])
+                registry.add_ssh(item['path_written'])
         
         # Update unknown count (cumulative)
-        registry['unknown'] += len(self.parsed_data['unknown'])
+        registry.add_unknown(len(self.parsed_data['unknown']))
         
-        # Write YAML (fallback to JSON if PyYAML not available)
-        try:
-            import yaml
-            with open(registry_file, 'w') as f:
-                yaml.dump(registry, f, default_flow_style=False, sort_keys=False)
-        except ImportError:
-            # Fallback to JSON with .yaml extension (less ideal but works)
-            import json
-            with open(registry_file, 'w') as f:
-                json.dump(registry, f, indent=2)
+        if registry.dirty:
+            self._writes.append(self._pool.submit(registry.save))
+        return registry
     
-    def _update_readme(self):
-        """Update secrets/README.md with run count and timestamp summary."""
+    def _update_readme(self, registry: Registry):
+        """Update secrets/README.md with run count and timestamp summary.
+
+        registry is the merged registry of _write_registry, which lists the
+        services of this and earlier runs.
+        """
         readme_path = self.output_base / "README.md"
         
-        # Count intake runs
-        intake_files = list(self.intake_dir.glob("*_raw.txt"))
-        run_count = len(intake_files)
+        # Count intake runs, starting from the raw intake files of runs from before they were recorded
+        runs = [self.timestamp]
+        if not self.fingerprints.has_runs():
+            runs += [raw_file.name[:-len('_raw.txt')] for raw_file in self.intake_dir.glob('*_raw.txt')]
+        run_count = self.fingerprints.add_runs(runs)
         
         # Get latest timestamp
         latest_timestamp = self.timestamp
         
         # Get all services from current and previous runs
-        services_detected = set()
-        for category in ['api_keys', 'credentials', 'tokens', 'db_uris', 'env_vars', 'endpoints']:
-            for item in self.parsed_data[category]:
-                service = item.get('service')
-                if service and service != 'unknown':
-                    services_detected.add(service)
-        
-        # Load existing services from registry if available
-        registry_file = self.output_base / "registry.yaml"
-        if registry_file.exists():
-            try:
-                import yaml
-                with open(registry_file, 'r') as f:
-                    registry = yaml.safe_load(f) or {}
-                    if 'services' in registry:
-                        for service in registry['services'].keys():
-                            services_detected.add(service)
-            except Exception:
-                pass
+        services_detected = {service for service in registry.services if service}
         
         readme_content = f"""# Confer Agent Kit Secrets Workspace
 
@@ -859,17 +3601,23 @@ This directory contains service-specific environment variables for {service}.
 \`\`\`
 secrets/
   _intake/              # Raw dumps and parse reports (timestamped)
+  _inbox/               # Drop directory ingested by --watch
   global/               # Reusable cross-project secrets
     .env.global         # Global environment variables
     credentials.csv     # Username/password pairs (masked)
     tokens.csv          # Bearer/JWT tokens (masked)
     endpoints.csv       # Service URLs
-    ssh/                # SSH keys
+    ssh/                # PEM blocks: SSH keys, certificates, PGP armor (<label>_<fingerprint>.<ext>)
   services/             # Service-specific secrets
     <service>/          # Per-service directory
       .env.local        # Service env vars
       README.md         # Documentation
   registry.yaml         # Master index
+  .registry.json        # Parsed copy of registry.yaml, for fast loads
+  fingerprints.db       # Inputs and values already ingested (dedup across runs)
+  inventory.db          # All records of all runs, masked and indexed (parse_secrets.sh query); the CSVs' source
+  .fingerprint.key      # Key of the value fingerprints, if keyed (--keyed-fingerprints)
+  services.yaml         # Optional extra service keywords, domains and email keywords
   README.md             # This file
 \`\`\`
 
@@ -917,12 +3665,13 @@ For team sharing, use:
 - [ ] Update platform env vars when rotating keys
 - [ ] Update `registry.yaml` when adding services
 - [ ] Remove old keys from `.env.global` or service `.env.local`
-- [ ] Verify no secrets in git history: `git log --all --full-history -- "**/*.env*"`
+- [ ] Verify no secrets in git history: `parse_secrets.sh scan --history <repo>`
+- [ ] Check working trees for leaked values: `parse_secrets.sh scan <repo>` (exits 1 on findings)
 
 ## Parse History
 
 **Total Intake Runs:** {run_count}
-**Latest Parse:** {latest_timestamp} ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+**Latest Parse:** {latest_timestamp} ({time.strftime('%Y-%m-%d %H:%M:%S')})
 
 ## Detected Services
 
@@ -938,34 +3687,1208 @@ The following services have been detected across all parse runs:
 - **Mask in logs** - secrets are masked (first 4 + last 2 chars) in reports
 """
         
-        readme_path.write_text(readme_content)
+        self._write_file(readme_path, readme_content)
 
 
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) > 1:
-        # Read from file
-        with open(sys.argv[1], 'r') as f:
-            raw_text = f.read()
+class ChunkParser(SecretsParser):
+    """SecretsParser for one parse_parallel chunk, run in a worker process.
+
+    Record additions are logged as (method, args) events for the parent to
+    replay in order instead of being applied, since deduplication and the
+    env var/API key check depend on every earlier chunk. Unknown lines take
+    part in neither; only their line numbers are sent back, as the parent
+    references its own copy of the text. Nothing is written to disk.
+    """
+
+    def __init__(self, engine: ScanEngine, catalog: ServiceCatalog):
+        self._init_parse(engine, catalog, {}, ValueInterner())
+        self.events: List[Tuple[str, tuple]] = []
+        self.unknown_nums = array('L')
+
+    def parse_chunk(self, text: str, before: int, size: int, offset: int, last: bool, scan: bool = True):
+        """Run the table pass and, if `scan`, the main pass over a chunk.
+
+        Returns (table events, line events, unknown line numbers, main_stop).
+        """
+        lines = text.split('\n')
+        if not last:
+            lines.pop()  # The lookahead ends with a newline
+        tags = self.engine.tag_lines(lines)
+        stop = before + size
+
+        self._scan_tables(lines[:stop], tags[:stop], before, offset)
+        table_events, self.events = self.events, []
+        if scan:
+            self._scan_lines(lines, tags, before, stop, offset)
+        return table_events, self.events, self.unknown_nums, self.main_stop
+
+    def _add_api_key(self, *args):
+        self.events.append(('_add_api_key', args))
+
+    def _add_credential(self, *args):
+        self.events.append(('_add_credential', args))
+
+    def _add_db_uri(self, *args):
+        self.events.append(('_add_db_uri', args))
+
+    def _add_ssh_key(self, *args):
+        self.events.append(('_add_ssh_key', args))
+
+    def _add_env_assignment(self, *args):
+        self.events.append(('_add_env_assignment', args))
+
+    def _add_endpoint(self, *args):
+        self.events.append(('_add_endpoint', args))
+
+    def _add_token(self, *args):
+        self.events.append(('_add_token', args))
+
+    def _add_unknown(self, line: str, line_num: int):
+        self.unknown_nums.append(line_num)
+
+    def _add_table(self, *args):
+        self.events.append(('_add_table', args))
+
+    def _prefetch_seen(self, values: Iterable[str]):
+        pass  # Deduplication happens in the parent
+
+    def classify_unknown(self):
+        pass  # So does classification, of the unknown lines replayed there
+
+
+class MemoryParser(SecretsParser):
+    """SecretsParser for one SecretsClassifier call: records stay in memory and nothing touches the disk."""
+
+    def __init__(self, engine: ScanEngine, catalog: ServiceCatalog, known: Container[str] = (),
+                 interner: Optional[ValueInterner] = None):
+        self._init_parse(engine, catalog, {category: RecordList(fields) for category, fields in RECORD_INDEXES.items()},
+                         interner or ValueInterner())
+        self.fingerprints = known
+
+    def _source_line(self, line: str, line_num: int, limit: int):
+        return line[:limit]  # Text is cheaper than a reference for records read right away
+
+    def result(self) -> 'ParseResult':
+        return ParseResult({category: tuple(map(MappingProxyType, items))
+                            for category, items in self.parsed_data.items()},
+                           self.value_hashes, self.ssh_keys, self.main_stop)
+
+
+class ParseResult:
+    """Immutable outcome of SecretsClassifier.parse.
+
+    records maps each parsed_data category to a tuple of read-only records,
+    values maps the value hashes in records to the secrets themselves, and
+    ssh_keys maps the key file names of the ssh records to the key blocks.
+    """
+
+    __slots__ = ('records', 'values', 'ssh_keys', 'main_stop')
+
+    def __init__(self, records: Dict[str, Tuple[Mapping[str, Any], ...]], values: Dict[str, str],
+                 ssh_keys: Dict[str, str], main_stop: Optional[int]):
+        object.__setattr__(self, 'records', MappingProxyType(records))
+        object.__setattr__(self, 'values', MappingProxyType(values))
+        object.__setattr__(self, 'ssh_keys', MappingProxyType(ssh_keys))
+        object.__setattr__(self, 'main_stop', main_stop)  # Line number of the credential line that ended the main pass
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("ParseResult is immutable")
+
+    def __getitem__(self, category: str) -> Tuple[Mapping[str, Any], ...]:
+        return self.records[category]
+
+    def counts(self) -> Dict[str, int]:
+        return {category: len(items) for category, items in self.records.items()}
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """The records as mutable, JSON-serializable parsed_data."""
+        return {category: [dict(item) for item in items] for category, items in self.records.items()}
+
+    def __repr__(self) -> str:
+        return f"ParseResult({self.counts()!r})"
+
+
+class SecretsClassifier:
+    """Side-effect-free parsing for library use, e.g. in a long-running service.
+
+    Each call parses in memory as SecretsParser.parse_raw_text would, with
+    no directories, files or database, and returns an immutable ParseResult;
+    the compiled rules and service catalog are kept across calls. Values are
+    deduplicated within a call, and against `known` value hashes if given
+    (e.g. the FingerprintIndex of an output base). SecretsParser.persist
+    writes a result out. Fingerprints are keyed with `key` if given; pass
+    load_fingerprint_key() of the output base the results are checked
+    against or persisted to.
+    """
+
+    def __init__(self, engine: Optional[ScanEngine] = None, catalog: Optional[ServiceCatalog] = None,
+                 known: Container[str] = (), key: Optional[bytes] = None):
+        self.engine = engine or default_engine()
+        self.catalog = catalog or default_catalog()
+        self.known = known
+        self.interner = ValueInterner(key)
+
+    def parse(self, raw_text: str) -> ParseResult:
+        parser = MemoryParser(self.engine, self.catalog, self.known, self.interner)
+        parser.parse_raw_text(raw_text)
+        return parser.result()
+
+    def parse_stream(self, source: Iterable[str]) -> ParseResult:
+        """parse() for a text stream, e.g. an open file or a request body."""
+        return self.parse(''.join(source))
+
+
+_worker_catalog: Optional[ServiceCatalog] = None
+
+def _init_worker(catalog: ServiceCatalog):
+    """Process pool initializer: the service catalog of the parent's parser."""
+    global _worker_catalog
+    _worker_catalog = catalog
+
+def _parse_chunk(task: Tuple[str, int, int, int, bool], catalog: Optional[ServiceCatalog] = None):
+    """Process pool entry point of SecretsParser.parse_parallel."""
+    return ChunkParser(default_engine(), catalog or _worker_catalog or default_catalog()).parse_chunk(*task)
+
+def _parse_timed(task: Tuple[str, int, int, int, bool, bool], catalog: Optional[ServiceCatalog] = None,
+                 engine: Optional[ScanEngine] = None):
+    """Process pool entry point of SecretsParser.parse_batch: _parse_chunk and its duration."""
+    start = time.perf_counter()
+    result = ChunkParser(engine or default_engine(),
+                         catalog or _worker_catalog or default_catalog()).parse_chunk(*task)
+    return result, time.perf_counter() - start
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Dump files named by paths, directories (all files below) and glob patterns, in order, once each."""
+    import glob
+    paths, seen = [], set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(str(p) for p in Path(pattern).rglob('*') if p.is_file())
+        elif not os.path.exists(pattern) and glob.has_magic(pattern):
+            matches = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+        else:
+            matches = [pattern]
+        for path in matches:
+            real = os.path.realpath(path)
+            if real not in seen:
+                seen.add(real)
+                paths.append(path)
+    return paths
+
+
+class InboxWatcher:
+    """Ingests dump files dropped into an inbox directory as they arrive (--watch).
+
+    The inbox is polled with one directory walk per interval, comparing the
+    size and mtime of each file with the previous poll. A new or changed
+    file is held until it has stopped changing for `settle` seconds, and all
+    files that have settled are parsed as one batch with a single
+    write_outputs pass, so a burst of drops costs one update of secrets/.
+    A steady trickle of drops is still flushed every `max_wait` seconds.
+    Inputs are fingerprinted as by the CLI: a file only appended to since it
+    was ingested is resumed from its checkpoint, one ingested unchanged is
+    skipped. Dotfiles and partial downloads (.part, .tmp, ...) are ignored
+    until renamed.
+    """
+
+    PARTIAL_SUFFIXES = ('.part', '.partial', '.tmp', '.swp', '.crdownload', '~')
+
+    def __init__(self, inbox: str, output_base: str = "secrets", workers: int = 1,
+                 interval: float = 1.0, settle: float = 2.0, max_wait: float = 30.0):
+        self.inbox = Path(inbox)
+        self.output_base = output_base
+        self.workers = workers
+        self.interval = interval
+        self.settle = settle
+        self.max_wait = max_wait
+        self.signatures: Dict[str, Tuple[int, int]] = {}  # Size and mtime of each file at the last poll
+        self.pending: Dict[str, Tuple[float, float]] = {}  # Changed files: (first, last) change time
+        self.stopped = threading.Event()
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """Size and mtime of every complete dump file below the inbox."""
+        found, dirs = {}, [str(self.inbox)]
+        while dirs:
+            try:
+                entries = os.scandir(dirs.pop())
+            except OSError:
+                continue  # Removed since listed
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or entry.name.endswith(self.PARTIAL_SUFFIXES):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            dirs.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        return found
+
+    def poll(self, now: Optional[float] = None) -> List[str]:
+        """Record changes since the last poll; return the files due for ingestion, in path order."""
+        now = time.monotonic() if now is None else now
+        current = self.scan()
+        for path, signature in current.items():
+            if self.signatures.get(path) != signature:
+                first = self.pending.get(path, (now, now))[0]
+                self.pending[path] = (first, now)
+        for path in self.signatures.keys() - current.keys():
+            self.pending.pop(path, None)
+        self.signatures = current
+
+        settled = sorted(path for path, (_, last) in self.pending.items() if now - last >= self.settle)
+        if not settled:
+            return []
+        # Wait for the rest of a burst, unless it has kept the settled files waiting too long
+        oldest = min(first for first, _ in self.pending.values())
+        if len(settled) < len(self.pending) and now - oldest < self.max_wait:
+            return []
+        for path in settled:
+            del self.pending[path]
+        return settled
+
+    def ingest(self, paths: List[str], pool: Optional['Executor'] = None) -> SecretsParser:
+        """Parse paths as one batch and write the outputs of whatever was new in them."""
+        parser = SecretsParser(self.output_base)
+        parser.pool = pool
+        try:
+            parser.parse_batch(paths, self.workers)
+            if any(stats['status'] != 'skipped' for stats in parser.batch):
+                parser.write_outputs()
+        finally:
+            parser.release_writes()
+            parser.fingerprints.close()
+        return parser
+
+    def run(self):
+        """Poll until SIGINT or SIGTERM, ingesting as files settle; a batch in progress is finished first."""
+        import signal
+        from concurrent.futures import ProcessPoolExecutor
+        self.inbox.mkdir(mode=0o700, parents=True, exist_ok=True)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stopped.set())
+        print(f"Watching {self.inbox} (every {self.interval:g}s); stop with Ctrl-C", flush=True)
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            while not self.stopped.is_set():
+                paths = self.poll()
+                if paths:
+                    self._ingest_logged(paths, pool)
+                self.stopped.wait(self.interval)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def _ingest_logged(self, paths: List[str], pool: Optional['Executor']):
+        try:
+            parser = self.ingest(paths, pool)
+        except (OSError, UnicodeDecodeError) as e:
+            # Most likely a file removed or rewritten mid-read: it is picked up again once it changes
+            print(f"⚠ Ingest of {len(paths)} file(s) failed: {e}", file=sys.stderr, flush=True)
+            return
+        for stats in parser.batch:
+            print(f"{parser.timestamp}  {stats['path']}: {stats['status']}, {stats['lines']} lines, "
+                  f"{stats['records']} records, {stats['unknown']} unknown", flush=True)
+
+
+LEAK_CATEGORIES = ('api_keys', 'tokens', 'db_uris', 'credentials', 'ssh')
+ALLOW_PRAGMA = 'secrets-parser: allow'  # Marks a line the leak scan should not report
+
+
+class LeakParser(MemoryParser):
+    """MemoryParser for the leak scan: every line is checked, and unknown lines are not kept.
+
+    The main pass of a parse ends at the first credential line (see
+    _scan_lines); here it carries on after each one. Source files and docs
+    are full of words, placeholders and code the dump rules would take for
+    secrets, so only plausible values are recorded: 8 characters or more,
+    no brackets, not a bare $VARIABLE, and DB URIs only with a password.
+    """
+
+    PLACEHOLDER = re.compile(r'[<>\[\](){}]|^\$\{?\w+\}?$')
+
+    @classmethod
+    def plausible(cls, value: Optional[str]) -> bool:
+        return bool(value) and len(value) >= 8 and not cls.PLACEHOLDER.search(value)
+
+    def _add_api_key(self, value: str, *args):
+        if self.plausible(value):
+            super()._add_api_key(value, *args)
+
+    def _add_token(self, value: str, *args):
+        if self.plausible(value):
+            super()._add_token(value, *args)
+
+    def _add_credential(self, username: Optional[str], password: Optional[str], *args):
+        if self.plausible(password):
+            super()._add_credential(username, password, *args)
+
+    def _add_db_uri(self, uri: str, *args):
+        userinfo, at, _ = uri.rpartition('@')
+        if at and self.plausible(userinfo.partition(':')[2]):
+            super()._add_db_uri(uri, *args)
+
+    def parse_raw_text(self, raw_text: str) -> Dict[str, Any]:
+        lines = raw_text.split('\n')
+        tags = self.engine.tag_lines(lines)
+        self._lines = TextLines(raw_text, lines)
+        self._scan_tables(lines, tags)
+        start = 0
+        while start is not None:
+            self.main_stop = None
+            self._scan_lines(lines, tags, start)
+            start = self.main_stop  # Index of the line after the credential line
+        self._lines = None
+        return self.parsed_data
+
+    def _add_unknown(self, line: str, line_num: int):
+        pass
+
+
+def find_leaks(text: str, engine: Optional[ScanEngine] = None) -> List[List[Any]]:
+    """Secrets in a text, by the parser's rules: [line number, category, service, masked value], in line order.
+
+    Only values that are secrets themselves count: API keys, tokens, DB
+    URIs, credentials with a password and private SSH keys, not env vars or
+    endpoints. Lines carrying ALLOW_PRAGMA are left out.
+    """
+    parser = LeakParser(engine or default_engine(), default_catalog())
+    parser.parse_raw_text(text)
+    leaks = []
+    for category in LEAK_CATEGORIES:
+        for record in parser.parsed_data[category]:
+            if category == 'ssh':
+                if record['type'] != 'PRIVATE':
+                    continue
+                masked = f"PEM {record['label']}"
+            else:
+                masked = record.get('value_masked') or record.get('uri_masked') or record.get('password_masked')
+            leaks.append([record['line_num'], category, record.get('service') or 'unknown', masked])
+    if leaks and ALLOW_PRAGMA in text:
+        lines = text.split('\n')
+        leaks = [leak for leak in leaks if ALLOW_PRAGMA not in lines[leak[0] - 1]]
+    return sorted(leaks)
+
+
+def _leaks_in(data: bytes) -> Optional[List[List[Any]]]:
+    """find_leaks for file contents; None for binary contents (a NUL byte in the first 8 KiB)."""
+    if b'\0' in data[:8192]:
+        return None
+    return find_leaks(data.decode('utf-8', 'replace'))
+
+
+def _scan_file(path: str) -> Optional[List[List[Any]]]:
+    """Process pool entry point of LeakScanner: the leaks in a file, None for a binary file."""
+    with open(path, 'rb') as f:
+        return _leaks_in(f.read())
+
+
+def _scan_blobs(blobs: List[Tuple[str, bytes]]) -> List[Tuple[str, Optional[List[List[Any]]]]]:
+    """Process pool entry point of HistoryScanner: (blob id, leaks) per blob, None for a binary blob."""
+    return [(sha, _leaks_in(data)) for sha, data in blobs]
+
+
+class ScanCache:
+    """Leaks found per file by earlier scans, valid while the file's size and mtime are unchanged.
+
+    Also per git blob id, which stays valid as long as the blob exists. A
+    SQLite database holding masked values only. Entries are dropped when
+    the rules change, i.e. when secrets_parser.py differs from the one that
+    scanned them.
+    """
+
+    def __init__(self, path: Path):
+        import sqlite3
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, signature TEXT, leaks TEXT) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, leaks TEXT) WITHOUT ROWID;
+        """)
+        rules = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'rules'").fetchone()
+        if row is None or row[0] != rules:
+            with self.db:
+                self.db.execute("DELETE FROM files")
+                self.db.execute("DELETE FROM blobs")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('rules', ?)", (rules,))
+        self._entries: Optional[Dict[str, Tuple[str, str]]] = None
+
+    def get(self, path: str, signature: str) -> Any:
+        """The leaks stored for path at this signature (None for a binary file), or False if there are none."""
+        if self._entries is None:
+            self._entries = {path: (signature, leaks)
+                             for path, signature, leaks in self.db.execute("SELECT * FROM files")}
+        entry = self._entries.get(path)
+        return json.loads(entry[1]) if entry is not None and entry[0] == signature else False
+
+    def put(self, results: Iterable[Tuple[str, str, Optional[List[List[Any]]]]]):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                                ((path, signature, json.dumps(leaks)) for path, signature, leaks in results))
+
+    def get_blobs(self, shas: List[str]) -> Dict[str, Optional[List[List[Any]]]]:
+        """The leaks stored for those of the blobs scanned before (None for a binary blob)."""
+        found = {}
+        for start in range(0, len(shas), 500):
+            chunk = shas[start:start + 500]
+            query = f"SELECT sha, leaks FROM blobs WHERE sha IN ({','.join('?' * len(chunk))})"
+            found.update((sha, json.loads(leaks)) for sha, leaks in self.db.execute(query, chunk))
+        return found
+
+    def put_blobs(self, results: Iterable[Tuple[str, Optional[List[List[Any]]]]]):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?)",
+                                ((sha, json.dumps(leaks)) for sha, leaks in results))
+
+    def close(self):
+        self.db.close()
+
+
+def default_scan_cache() -> Path:
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'secrets-parser' / 'scan-cache.db'
+
+
+class LeakScanner:
+    """Scans files for leaked secrets with the parser's rules (the `scan` command).
+
+    Directories are listed with git, tracked and untracked files but not
+    ignored ones, inside a work tree, and otherwise walked without VCS and
+    dependency directories; files named explicitly are always scanned.
+    Binary files (a NUL byte in the first 8 KiB) and files over max_size
+    bytes are skipped. With a cache, a re-scan only reads files whose size
+    or mtime changed. The rest are scanned in a pool of `workers` processes.
+    """
+
+    SKIP_DIRS = {'.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv', '.tox', '.nox',
+                 '.mypy_cache', '.pytest_cache', '.ruff_cache'}
+
+    def __init__(self, cache: Optional[ScanCache] = None, workers: int = 1, max_size: int = 5 << 20):
+        self.cache = cache
+        self.workers = workers
+        self.max_size = max_size
+        self.stats = {'files': 0, 'cached': 0, 'scanned': 0, 'skipped': 0}
+
+    def files(self, paths: List[str]) -> List[str]:
+        """The files to scan under paths, in order, once each."""
+        files, seen = [], set()
+        for path in paths:
+            if os.path.isdir(path):
+                listed = self._git_files(path)
+                found = sorted(listed if listed is not None else self._walk(path))
+            else:
+                found = [path]
+            for file in found:
+                real = os.path.realpath(file)
+                if real not in seen:
+                    seen.add(real)
+                    files.append(file)
+        return files
+
+    @staticmethod
+    def _git_files(directory: str) -> Optional[List[str]]:
+        """Tracked and untracked, not ignored, files under directory; None outside a git work tree."""
+        import subprocess
+        try:
+            listing = subprocess.run(['git', '-C', directory, 'ls-files', '-z', '--cached', '--others',
+                                      '--exclude-standard'], capture_output=True, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return [os.path.normpath(os.path.join(directory, os.fsdecode(name)))
+                for name in listing.split(b'\0') if name]
+
+    def _walk(self, directory: str) -> Iterator[str]:
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = [name for name in dirs if name not in self.SKIP_DIRS]
+            for name in names:
+                yield os.path.normpath(os.path.join(root, name))
+
+    def scan(self, paths: List[str]) -> Dict[str, List[List[Any]]]:
+        """Leaks per file under paths, for the files with any; counts go to self.stats."""
+        import stat
+        results: Dict[str, List[List[Any]]] = {}
+        todo, signatures = [], {}
+        for path in self.files(paths):
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue  # Deleted but still tracked, or a broken link
+            if not stat.S_ISREG(info.st_mode) or info.st_size > self.max_size:
+                self.stats['skipped'] += 1
+                continue
+            self.stats['files'] += 1
+            key = os.path.abspath(path)
+            signatures[path] = signature = f"{info.st_size}:{info.st_mtime_ns}"
+            leaks = self.cache.get(key, signature) if self.cache is not None else False
+            if leaks is False:
+                todo.append(path)
+            elif leaks is None:
+                self.stats['skipped'] += 1  # Binary or unreadable, as when it was scanned
+            else:
+                self.stats['cached'] += 1
+                if leaks:
+                    results[path] = leaks
+
+        found = []
+        if self.workers > 1 and len(todo) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            default_engine()  # Compiled before the pool forks, so workers inherit it
+            workers = min(self.workers, len(todo))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                found = list(pool.map(_scan_file, todo, chunksize=max(1, min(64, len(todo) // (workers * 4)))))
+        else:
+            found = list(map(_scan_file, todo))
+        self.stats['scanned'] = len(todo)
+        if self.cache is not None:
+            self.cache.put((os.path.abspath(path), signatures[path], leaks) for path, leaks in zip(todo, found))
+        for path, leaks in zip(todo, found):
+            if leaks:
+                results[path] = leaks
+        self.stats['skipped'] += found.count(None)
+        return dict(sorted(results.items()))
+
+
+def _nul_fields(stream: BinaryIO) -> Iterator[bytes]:
+    """The NUL-terminated fields of a stream, read a block at a time."""
+    rest = b''
+    for block in iter(lambda: stream.read(1 << 16), b''):
+        fields = (rest + block).split(b'\0')
+        rest = fields.pop()
+        yield from fields
+    if rest:
+        yield rest
+
+
+class HistoryScanner:
+    """Scans every blob reachable from any ref of a git repository (`scan --history`).
+
+    One `git log --raw` walk, oldest commits first, finds each blob with the
+    first commit and path that brought it in: a blob is scanned once however
+    many commits hold it, and its leaks are reported there. The blobs the
+    cache does not know are sized by one `git cat-file --batch-check`, then
+    streamed through one `git cat-file --batch` into a pool of `workers`
+    processes. Results are cached by blob id as batches finish, so a later
+    scan, or one resumed after an interruption, only reads new objects.
+    """
+
+    BATCH_BYTES = 1 << 20
+
+    def __init__(self, repo: str, cache: Optional[ScanCache] = None, workers: int = 1, max_size: int = 5 << 20):
+        self.repo = repo
+        self.cache = cache
+        self.workers = workers
+        self.max_size = max_size
+        self.stats = {'commits': 0, 'blobs': 0, 'cached': 0, 'scanned': 0, 'skipped': 0}
+
+    def _git(self, *args: str, **kwargs) -> 'subprocess.Popen':
+        import subprocess
+        return subprocess.Popen(['git', '-C', self.repo, *args], stdout=subprocess.PIPE, **kwargs)
+
+    def introductions(self) -> Dict[str, Tuple[str, str]]:
+        """Each file blob in the history, in order of appearance, with the earliest commit and path holding it.
+
+        Merges are diffed against their first parent, so blobs first made
+        by a conflict resolution are found too.
+        """
+        import subprocess
+        log = self._git('log', '--all', '--date-order', '--reverse', '--raw', '--no-renames', '--no-abbrev',
+                        '--diff-merges=first-parent', '--format=%x00%H', '-z', stderr=subprocess.PIPE)
+        blobs: Dict[str, Tuple[str, str]] = {}
+        paths: Dict[bytes, str] = {}
+        commit = ''
+        fields = _nul_fields(log.stdout)
+        for field in fields:
+            field = field.lstrip(b'\n')
+            if not field:
+                continue
+            if not field.startswith(b':'):
+                commit = field.decode()
+                self.stats['commits'] += 1
+                continue
+            raw_path = next(fields)
+            # :old_mode new_mode old_sha new_sha status; regular files only, not links, submodules or deletions
+            _, mode, _, sha, _ = field.split(b' ')
+            if not mode.startswith(b'100'):
+                continue
+            sha = sha.decode()
+            if sha not in blobs:
+                path = paths.get(raw_path)
+                if path is None:
+                    path = paths[raw_path] = os.fsdecode(raw_path)
+                blobs[sha] = (commit, path)
+        error = log.stderr.read().decode(errors='replace').strip()
+        if log.wait():
+            raise RuntimeError(f"git log failed in {self.repo}: {error}")
+        return blobs
+
+    def _sizes(self, shas: List[str]) -> Dict[str, int]:
+        import subprocess
+        listing = subprocess.run(['git', '-C', self.repo, 'cat-file', '--batch-check=%(objectname) %(objectsize)',
+                                  '--buffer'], input=''.join(f"{sha}\n" for sha in shas).encode(),
+                                 capture_output=True, check=True).stdout
+        sizes = {}
+        for line in listing.decode().splitlines():
+            sha, _, size = line.partition(' ')
+            if size.isdigit():
+                sizes[sha] = int(size)
+        return sizes
+
+    def _contents(self, shas: List[str]) -> Iterator[Tuple[str, bytes]]:
+        """(blob id, contents) for shas, read through one cat-file process fed from a thread."""
+        import subprocess
+        cat = self._git('cat-file', '--batch', '--buffer', stdin=subprocess.PIPE)
+
+        def feed():
+            try:
+                for sha in shas:
+                    cat.stdin.write(f"{sha}\n".encode())
+                cat.stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass  # Reading stopped early
+
+        threading.Thread(target=feed, daemon=True).start()
+        try:
+            for _ in shas:
+                header = cat.stdout.readline().split()
+                if len(header) != 3:
+                    continue  # "<sha> missing"
+                data = cat.stdout.read(int(header[2]))
+                cat.stdout.read(1)
+                yield header[0].decode(), data
+        finally:
+            cat.stdout.close()
+            cat.kill()
+            cat.wait()
+
+    def _batches(self, contents: Iterator[Tuple[str, bytes]]) -> Iterator[List[Tuple[str, bytes]]]:
+        batch, size = [], 0
+        for sha, data in contents:
+            batch.append((sha, data))
+            size += len(data)
+            if size >= self.BATCH_BYTES or len(batch) >= 256:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+    def _scanned(self, shas: List[str]) -> Iterator[List[Tuple[str, Optional[List[List[Any]]]]]]:
+        """Results per batch of the blobs, as batches finish; at most two batches per worker in flight."""
+        batches = self._batches(self._contents(shas))
+        if self.workers <= 1:
+            yield from map(_scan_blobs, batches)
+            return
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        default_engine()  # Compiled before the pool forks, so workers inherit it
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            for batch in batches:
+                pending.add(pool.submit(_scan_blobs, batch))
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in pending:
+                yield future.result()
+
+    def scan(self) -> List[Tuple[str, str, List[List[Any]]]]:
+        """(commit, path, leaks) for each blob with leaks, in history order; counts go to self.stats."""
+        blobs = self.introductions()
+        shas = list(blobs)
+        results = self.cache.get_blobs(shas) if self.cache is not None else {}
+        todo = [sha for sha in shas if sha not in results]
+        sizes = self._sizes(todo) if todo else {}
+        wanted = [sha for sha in todo if sizes.get(sha, self.max_size + 1) <= self.max_size]
+        binary = sum(leaks is None for leaks in results.values())  # Skipped as when they were scanned
+        self.stats.update(blobs=len(shas), cached=len(results) - binary, skipped=len(todo) - len(wanted) + binary)
+        for batch in self._scanned(wanted):
+            self.stats['scanned'] += len(batch)
+            if self.cache is not None:
+                self.cache.put_blobs(batch)
+            for sha, leaks in batch:
+                results[sha] = leaks
+                if leaks is None:
+                    self.stats['skipped'] += 1
+        return [(commit, path, results[sha]) for sha, (commit, path) in blobs.items() if results.get(sha)]
+
+
+def scan_main(argv: List[str], stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """The `scan` command: report leaked secrets under paths; exit status 1 if there are any."""
+    stdout, stderr = stdout or sys.stdout, stderr or sys.stderr
+    cli = _ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} scan", stdout=stdout, stderr=stderr,
+                          description="Scan files for leaked secrets with the parser's rules. "
+                                      f"Add '{ALLOW_PRAGMA}' to a line to accept what it holds.")
+    cli.add_argument('paths', nargs='*', default=['.'], metavar='path',
+                     help="file or directory to scan (default: .); directories in a git work tree "
+                          "are scanned without git-ignored files")
+    cli.add_argument('--history', action='store_true',
+                     help="scan every blob ever committed to the git repositories at paths instead, "
+                          "reporting each at the earliest commit and path holding it")
+    cli.add_argument('--workers', type=int, default=os.cpu_count() or 1, metavar='N',
+                     help="scan in N processes (default: one per CPU)")
+    cli.add_argument('--max-size', type=int, default=5 << 20, metavar='BYTES',
+                     help="skip larger files or blobs (default: %(default)s)")
+    cli.add_argument('--cache', type=Path, default=None, metavar='PATH',
+                     help="per-file and per-blob result cache "
+                          "(default: $XDG_CACHE_HOME/secrets-parser/scan-cache.db)")
+    cli.add_argument('--no-cache', action='store_true', help="scan every file, without reading or updating the cache")
+    args = cli.parse_args(argv)
+    if args.workers < 1:
+        cli.error("--workers must be at least 1")
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        cli.error(f"no such file or directory: {', '.join(missing)}")
+
+    cache = None if args.no_cache else ScanCache(args.cache or default_scan_cache())
+    if args.history:
+        try:
+            return _scan_history(args.paths, cache, args.workers, args.max_size, stdout, stderr)
+        except RuntimeError as e:
+            cli.exit(2, f"{cli.prog}: error: {e}\n")
+        finally:
+            if cache is not None:
+                cache.close()
+    scanner = LeakScanner(cache, args.workers, args.max_size)
+    try:
+        results = scanner.scan(args.paths)
+    finally:
+        if cache is not None:
+            cache.close()
+    for path, leaks in results.items():
+        for line_num, category, service, masked in leaks:
+            print(f"{path}:{line_num}: {category} ({service}) {masked}", file=stdout)
+    stats = scanner.stats
+    count = sum(map(len, results.values()))
+    print(f"{count} possible secret(s) in {len(results)} of {stats['files']} files "
+          f"({stats['scanned']} scanned, {stats['cached']} cached, {stats['skipped']} skipped)", file=stderr)
+    return 1 if results else 0
+
+
+def _scan_history(repos: List[str], cache: Optional[ScanCache], workers: int, max_size: int,
+                  stdout: TextIO, stderr: TextIO) -> int:
+    """`scan --history`: report the leaks in the history of each repository; exit status 1 if there are any."""
+    total = 0
+    for repo in repos:
+        scanner = HistoryScanner(repo, cache, workers, max_size)
+        results = scanner.scan()
+        prefix = '' if len(repos) == 1 else f"{repo}: "
+        for commit, path, leaks in results:
+            for line_num, category, service, masked in leaks:
+                print(f"{prefix}{commit[:12]} {path}:{line_num}: {category} ({service}) {masked}", file=stdout)
+        stats = scanner.stats
+        count = sum(len(leaks) for _, _, leaks in results)
+        total += count
+        print(f"{prefix}{count} possible secret(s) in {len(results)} of {stats['blobs']} blobs across "
+              f"{stats['commits']} commits ({stats['scanned']} scanned, {stats['cached']} cached, "
+              f"{stats['skipped']} skipped)", file=stderr)
+    return 1 if total else 0
+
+
+def query_main(argv: List[str], stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """The `query` command: look records up in an output base's inventory; exit status 1 if none match."""
+    stdout = stdout or sys.stdout
+    cli = _ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} query", stdout=stdout, stderr=stderr or sys.stderr,
+                          description="Look up records in the inventory of all runs (masked values "
+                                      "only). Filter values with * or ? match as globs.")
+    cli.add_argument('--output', default='secrets', metavar='DIR',
+                     help="secrets workspace to query (default: ./secrets)")
+    for column in ('service', 'category', 'name', 'kind', 'username', 'masked', 'fingerprint', 'host', 'url', 'run'):
+        cli.add_argument(f'--{column}', metavar='VALUE')
+    cli.add_argument('--distinct', choices=Inventory.COLUMNS, metavar='COLUMN',
+                     help="print the distinct values of COLUMN among the matches, e.g. --masked 'sk-p…' "
+                          "--distinct service, or --service postgres --distinct host")
+    cli.add_argument('--json', action='store_true', help="print matches as JSON lines")
+    args = cli.parse_args(argv)
+    path = Path(args.output) / "inventory.db"
+    if not path.exists():
+        if not (Path(args.output) / "_intake").is_dir():
+            cli.error(f"no inventory in {args.output}: nothing was parsed into it yet")
+        Inventory.open(Path(args.output)).close()  # An output base from before the inventory
+    inventory = Inventory(path, readonly=True)
+    filters = {column: value for column in Inventory.COLUMNS
+               if (value := getattr(args, column, None)) is not None}
+    try:
+        matches = inventory.query(filters, args.distinct)
+    finally:
+        inventory.close()
+    if args.distinct is not None or args.json:
+        for match in matches:
+            print(json.dumps(match) if args.json else match, file=stdout)
+    elif matches:
+        columns = [column for column in Inventory.COLUMNS
+                   if column != 'fingerprint' and any(match[column] not in (None, '') for match in matches)]
+        table = [columns] + [['' if match[column] is None else str(match[column]) for column in columns]
+                             for match in matches]
+        widths = [max(map(len, column)) for column in zip(*table)]
+        for row in table:
+            print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip(), file=stdout)
+    return 0 if matches else 1
+
+
+def default_socket_path() -> str:
+    """Socket of the parse daemon: $SECRETS_PARSER_SOCKET, else one per user in the runtime or temp directory."""
+    path = os.environ.get('SECRETS_PARSER_SOCKET')
+    if path:
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'secrets-parser.sock')
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f'secrets-parser-{os.getuid()}.sock')
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser printing its help, usage and errors to the streams of its run instead of sys's."""
+
+    def __init__(self, *args, stdout: TextIO, stderr: TextIO, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def _print_message(self, message: str, file: Optional[TextIO] = None):
+        if message:
+            (self.stderr if file is sys.stderr else self.stdout).write(message)
+
+
+class ParseDaemon:
+    """Resident parser serving CLI runs over a Unix domain socket (--serve).
+
+    Each request is one CLI run: a JSON header line with its arguments and
+    the byte length of its stdin, then the stdin bytes. The reply is one
+    JSON line with the run's exit status, stdout and stderr. Requests are
+    read concurrently by an asyncio server and run as main() would run
+    in-process, each in a thread with its own stdin, stdout and stderr
+    passed to main(), and with chunk parsing in one shared process
+    pool whose workers keep the compiled rules. Runs on the same output
+    base share its write lock (see SecretsParser.hold_writes), so their
+    writes never interleave.
+    """
+
+    def __init__(self, socket_path: str, workers: int):
+        self.socket_path = socket_path
+        self.workers = workers
+        self.pool: Optional['ProcessPoolExecutor'] = None
+        self._threads: Optional['ThreadPoolExecutor'] = None
+        self._write_locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def write_lock(self, output_base: Path) -> threading.Lock:
+        key = os.path.realpath(output_base)
+        with self._locks_lock:
+            return self._write_locks.setdefault(key, threading.Lock())
+
+    def serve_forever(self):
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        if _daemon_connection(self.socket_path) is not None:
+            raise RuntimeError(f"a parse daemon is already listening on {self.socket_path}")
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left behind by a daemon that did not shut down
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        list(self.pool.map(_warm_worker, range(self.workers)))
+        self._threads = ThreadPoolExecutor(thread_name_prefix='parse-request')
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._threads.shutdown()
+            self.pool.shutdown()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+    async def _serve(self):
+        import asyncio, signal
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, lambda: stopped.done() or stopped.set_result(None))
+        umask = os.umask(0o177)  # Only this user may connect
+        try:
+            server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        finally:
+            os.umask(umask)
+        print(f"Parse daemon listening on {self.socket_path} ({self.workers} workers)", file=sys.stderr)
+        async with server:
+            await stopped
+
+    async def _handle(self, reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter'):
+        import asyncio
+        try:
+            request = json.loads(await reader.readline())
+            stdin = ''
+            if request.get('stdin') is not None:
+                stdin = (await reader.readexactly(request['stdin'])).decode('utf-8', 'surrogatepass')
+            reply = await asyncio.get_running_loop().run_in_executor(self._threads, self._run,
+                                                                     request['argv'], stdin)
+        except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError) as e:
+            reply = {'status': 2, 'stdout': '', 'stderr': f"bad request: {e}\n"}
+        writer.write(json.dumps(reply).encode() + b'\n')
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    def _run(self, argv: List[str], stdin: str) -> Dict[str, Any]:
+        """Run one CLI invocation with its own stdin, stdout and stderr."""
+        out, err = io.StringIO(), io.StringIO()
+        try:
+            status = main(argv, daemon=self, stdin=io.StringIO(stdin), stdout=out, stderr=err)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (e.code is not None)
+            if isinstance(e.code, str):
+                print(e.code, file=err)
+        except Exception:
+            import traceback
+            traceback.print_exc(file=err)
+            status = 1
+        return {'status': status, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+
+def _warm_worker(_):
+    """Compile the rules in a daemon pool process ahead of its first request."""
+    default_engine()
+    default_catalog()
+
+
+def _daemon_connection(socket_path: str) -> Optional['socket.socket']:
+    """A connection to the daemon at socket_path, or None if none of this user's is listening there."""
+    try:
+        if os.stat(socket_path).st_uid != os.getuid():
+            return None  # Never hand secrets to another user's socket
+        import socket
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except OSError:
+        return None
+    try:
+        conn.connect(socket_path)
+    except OSError:
+        conn.close()
+        return None
+    return conn
+
+
+def run_in_daemon(conn: 'socket.socket', argv: List[str], stdin: Optional[str],
+                  stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """Send one CLI run to the daemon over conn, print its output and return its exit status."""
+    # surrogatepass: stdin read with surrogateescape reaches the daemon as the same text
+    data = stdin.encode('utf-8', 'surrogatepass') if stdin is not None else b''
+    with conn:
+        conn.sendall(json.dumps({'argv': argv, 'stdin': len(data) if stdin is not None else None}).encode()
+                     + b'\n' + data)
+        reply = json.loads(conn.makefile('rb').readline())
+    (stdout or sys.stdout).write(reply['stdout'])
+    (stderr or sys.stderr).write(reply['stderr'])
+    return reply['status']
+
+
+def main(argv: Optional[List[str]] = None, daemon: Optional[ParseDaemon] = None, stdin: Optional[TextIO] = None,
+         stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """Run the CLI on argv with the given streams (default: those of sys), as the daemon does for each request."""
+    argv = sys.argv[1:] if argv is None else argv
+    stdin, stdout, stderr = stdin or sys.stdin, stdout or sys.stdout, stderr or sys.stderr
+    if argv[:1] == ['scan']:
+        return scan_main(argv[1:], stdout, stderr)
+    if argv[:1] == ['query']:
+        return query_main(argv[1:], stdout, stderr)
+    cli = _ArgumentParser(description="Classify a raw secrets dump into the secrets/ workspace.",
+                          epilog="Other commands: scan [path ...] finds leaked secrets in files "
+                                 "(see scan --help); query [--service S ...] looks up the records "
+                                 "of all runs (see query --help).", stdout=stdout, stderr=stderr)
+    cli.add_argument('inputs', nargs='*', metavar='input',
+                     help="dump file, directory or glob pattern to parse (default: stdin); "
+                          "several are parsed as one batch")
+    cli.add_argument('--output', default='secrets', metavar='DIR',
+                     help="secrets workspace to write to (default: ./secrets)")
+    cli.add_argument('--stream', action='store_true',
+                     help="parse in bounded memory, spooling records to disk (for multi-GB dumps)")
+    cli.add_argument('--workers', type=int, metavar='N',
+                     help="parse in N processes (default: 1, or one per CPU for a batch)")
+    cli.add_argument('--rescan', action='store_true',
+                     help="parse inputs in full and report values already ingested by earlier runs")
+    cli.add_argument('--profile', action='store_true',
+                     help="count evaluations, hits and time of every rule, in the parse report and "
+                          "_intake/<timestamp>_profile.json (parses in one process)")
+    cli.add_argument('--keyed-fingerprints', action='store_true',
+                     help="fingerprint values with keyed BLAKE2b instead of SHA-256, under a random key "
+                          "kept in the output base for all its runs (new output bases only)")
+    cli.add_argument('--dry-run', '--summary', dest='dry_run', action='store_true',
+                     help="only print what the inputs contain, deduplicated against earlier runs; "
+                          "nothing is written")
+    cli.add_argument('--serve', action='store_true',
+                     help="run as a resident daemon that parses the runs of this CLI sent over --socket")
+    cli.add_argument('--socket', metavar='PATH',
+                     help="Unix socket of the daemon (default: $SECRETS_PARSER_SOCKET, else one per user "
+                          "in $XDG_RUNTIME_DIR or the temp directory)")
+    cli.add_argument('--no-daemon', action='store_true',
+                     help="parse in this process even if a daemon is running")
+    cli.add_argument('--watch', nargs='?', const='', metavar='DIR',
+                     help="keep running and ingest files dropped into DIR (default: <output>/_inbox) "
+                          "as they arrive, in batches")
+    cli.add_argument('--interval', type=float, default=1.0, metavar='SECONDS',
+                     help="how often --watch polls its directory (default: %(default)s)")
+    args = cli.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        cli.error("--workers must be at least 1")
+    args.socket = args.socket or default_socket_path()
+    if args.serve:
+        try:
+            ParseDaemon(args.socket, args.workers or os.cpu_count() or 1).serve_forever()
+        except RuntimeError as e:
+            cli.error(str(e))
+        return 0
+    if args.watch is not None:
+        if args.inputs or args.stream:
+            cli.error("--watch takes no inputs and cannot be combined with --stream")
+        if args.interval <= 0:
+            cli.error("--interval must be positive")
+        inbox = args.watch or os.path.join(args.output, '_inbox')
+        InboxWatcher(inbox, args.output, args.workers or 1, args.interval).run()
+        return 0
+    if daemon is None and not args.no_daemon and not args.stream:
+        conn = _daemon_connection(args.socket)
+        if conn is not None:
+            # The daemon runs elsewhere: send it absolute paths, and stdin if it is the input
+            forward = [os.path.abspath(pattern) for pattern in args.inputs]
+            forward += ['--output', os.path.abspath(args.output)]
+            if args.workers is not None:
+                forward += ['--workers', str(args.workers)]
+            forward += [flag for flag, on in (('--rescan', args.rescan), ('--profile', args.profile),
+                                              ('--dry-run', args.dry_run),
+                                              ('--keyed-fingerprints', args.keyed_fingerprints)) if on]
+            return run_in_daemon(conn, forward, None if args.inputs else stdin.read(), stdout, stderr)
+
+    paths = expand_inputs(args.inputs)
+    if args.inputs and not paths:
+        cli.error("no files match the given inputs")
+    batch = len(paths) > 1 or paths != args.inputs
+    if args.dry_run:
+        if args.stream or args.profile:
+            cli.error("--dry-run cannot be combined with --stream or --profile")
+        return _dry_run(args, paths, stdin, stdout)
+    workers = args.workers or ((os.cpu_count() or 1) if batch else 1)
+    if args.stream and (batch or workers > 1):
+        cli.error("--stream takes a single input and cannot be combined with --workers")
+    if args.profile:
+        if args.workers is not None and args.workers > 1:
+            cli.error("--profile parses in one process and cannot be combined with --workers")
+        workers = 1
+    elif daemon is not None and args.workers is None and not args.stream:
+        workers = daemon.workers  # Chunk across the daemon's warm pool
+    path = paths[0] if paths else None
+
+    parser = SecretsParser(args.output, engine=ProfilingEngine() if args.profile else None, rescan=args.rescan)
+    if daemon is not None:
+        parser.pool = daemon.pool
+        parser.write_lock = daemon.write_lock(parser.output_base)
+    if args.keyed_fingerprints:
+        try:
+            parser.use_keyed_fingerprints()
+        except ValueError as e:
+            cli.error(str(e))
+    try:
+        return _run(parser, args, paths, path, batch, workers, stdin, stdout)
+    finally:
+        parser.release_writes()
+
+
+def _run(parser: SecretsParser, args: argparse.Namespace, paths: List[str], path: Optional[str],
+         batch: bool, workers: int, stdin: TextIO, stdout: TextIO) -> int:
+    if batch:
+        parser.parse_batch(paths, workers)
+        if all(stats['status'] == 'skipped' for stats in parser.batch):
+            print("All inputs already ingested by earlier runs; nothing to parse.", file=stdout)
+            return 0
+        parsed = parser.parsed_data
+        outputs = parser.write_outputs()
+        return _print_summary(parser, parsed, outputs, stdout)
+
+    raw_text = None
+    if path:
+        intake = parser.fingerprint_input(path)
+    elif not args.stream:
+        raw_text = stdin.read()
+        intake = parser.fingerprint_text(raw_text)
+    else:
+        intake = {}  # Streamed stdin is neither skipped nor resumed
+    if intake.get('run') and not args.rescan:
+        print(f"Input already ingested by run {intake['run']}; nothing to parse.", file=stdout)
+        return 0
+
+    if intake.get('resume') and not args.rescan:
+        # Only data was appended since the last run over this file
+        parsed = parser.parse_tail(path, intake['resume'])
+        outputs = parser.write_outputs()
+    elif workers > 1:
+        # Chunk the whole dump across a process pool
+        if path:
+            raw_text = Path(path).read_text()
+        parsed = parser.parse_parallel(raw_text, workers)
+        outputs = parser.write_outputs(raw_text)
+    elif path:
+        # Memory-map the file
+        parsed = parser.parse_file(path, spool=args.stream)
+        outputs = parser.write_outputs()
+    elif args.stream:
+        parsed = parser.parse_stream(stdin)
+        outputs = parser.write_outputs()
     else:
         # Read from stdin
-        raw_text = sys.stdin.read()
-    
-    parser = SecretsParser()
-    parsed = parser.parse_raw_text(raw_text)
-    outputs = parser.write_outputs(raw_text)
-    
-    # Print summary
-    print("\n=== Secrets Parse Complete ===\n")
-    print(f"✓ Raw text saved: {outputs['raw_file']}")
-    print(f"✓ Parsed JSON saved: {outputs['json_file']}")
-    print(f"✓ Report saved: {outputs['report_file']}\n")
+        parsed = parser.parse_raw_text(raw_text)
+        outputs = parser.write_outputs(raw_text)
+    return _print_summary(parser, parsed, outputs, stdout)
+
+
+def _dry_run(args: argparse.Namespace, paths: List[str], stdin: TextIO, stdout: TextIO) -> int:
+    """--dry-run: classify the inputs in memory and print the summary.
+
+    Inputs are parsed one after another, deduplicated as a batch would be,
+    against the output base's fingerprints (read-only) unless rescanning.
+    Nothing is created, not even the output base.
+    """
+    output_base = Path(args.output)
+    fingerprints = output_base / "fingerprints.db"
+    known = FingerprintIndex(fingerprints, readonly=True) if fingerprints.exists() and not args.rescan else ()
+    parser = MemoryParser(default_engine(), ServiceCatalog.load(output_base / "services.yaml"), known,
+                          ValueInterner(load_fingerprint_key(output_base)))
+    if paths:
+        for path in paths:
+            parser.parse_raw_text(Path(path).read_text())
+    else:
+        parser.parse_raw_text(stdin.read())
+    return _print_summary(parser, parser.parsed_data, None, stdout)
+
+
+def _print_summary(parser: SecretsParser, parsed: Dict[str, Any], outputs: Optional[Dict[str, str]],
+                   stdout: TextIO) -> int:
+    """Print what a run found to stdout; outputs are the files of write_outputs, None for a dry run."""
+    if outputs is None:
+        print("\n=== Secrets Parse Summary (dry run, nothing written) ===\n", file=stdout)
+    else:
+        print("\n=== Secrets Parse Complete ===\n", file=stdout)
+        print(f"✓ Raw text saved: {outputs['raw_file']}", file=stdout)
+        print(f"✓ Parsed JSON saved: {outputs['json_file']}", file=stdout)
+        print(f"✓ Report saved: {outputs['report_file']}", file=stdout)
+        if 'profile_file' in outputs:
+            print(f"✓ Rule profile saved: {outputs['profile_file']}", file=stdout)
+        print(file=stdout)
+
+    if parser.batch is not None:
+        print("Inputs:", file=stdout)
+        for stats in parser.batch:
+            print(f"  - {stats['path']}: {stats['status']}, {stats['lines']} lines, {stats['records']} records, "
+                  f"{stats['unknown']} unknown, {stats['seconds']:.2f}s", file=stdout)
+        print(file=stdout)
     
-    print("Summary by category:")
+    print("Summary by category:", file=stdout)
     for category, items in parsed.items():
         if items:
-            print(f"  - {category.replace('_', ' ').title()}: {len(items)}")
+            print(f"  - {category.replace('_', ' ').title()}: {len(items)}", file=stdout)
     
     services_detected = set()
     for category in ['api_keys', 'credentials', 'tokens', 'db_uris', 'env_vars', 'endpoints']:
@@ -975,9 +4898,20 @@ if __name__ == "__main__":
                 services_detected.add(service)
     
     if services_detected:
-        print(f"\n✓ Services detected: {', '.join(sorted(services_detected))}")
+        print(f"\n✓ Services detected: {', '.join(sorted(services_detected))}", file=stdout)
     
+    doubtful = [table for table in parser.tables if table['confidence'] < 0.9]
+    if doubtful:
+        where = ', '.join(f"line {table['line_num']} ({table['confidence']:.0%})" for table in doubtful)
+        print(f"\n⚠ Credential tables with rows that do not match their header: {where}", file=stdout)
+
     if parsed['unknown']:
-        print(f"\n⚠ Unknown items requiring review: {len(parsed['unknown'])}")
-        print("   Check the parse report for details.")
+        print(f"\n⚠ Unknown items requiring review: {len(parsed['unknown'])}", file=stdout)
+        if parser.recorded_unknown:
+            print(f"   Keys or tokens found in {parser.recorded_unknown} of them are recorded as such.", file=stdout)
+        print("   Check the parse report for details.", file=stdout)
+    return 0
 
+
+if __name__ == "__main__":
+    sys.exit(main())